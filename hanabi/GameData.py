@@ -1,7 +1,60 @@
 # Data to be passed from client to server
-import pickle
+from constants import DATASIZE, MAX_DATASIZE
+import codec
+
+# Each message is framed as a 4 bytes (little endian) length followed by exactly that many bytes of payload
+HEADER_SIZE = 4
+
+# Cards and players, as the server sends them
+class Card(object):
+    def __init__(self, id, value, color) -> None:
+        super().__init__()
+        self.id = id
+        self.value = value
+        self.color = color
+
+    def toString(self):
+        return ("Card " + str(self.id) + "; value: " + str(self.value) + "; color: " + str(self.color))
+
+    def toClientString(self):
+        return ("Card " + str(self.value) + " - " + str(self.color))
+
+    def __repr__(self):
+        return ("Card " + str(self.value) + " - " + str(self.color))
+
+    def __hash__(self):
+        return self.id
+
+    def __eq__(self, other):
+        if not isinstance(other, type(self)):
+            return NotImplemented
+        return self.id == other.id
+
+
+class Player(object):
+    def __init__(self, name) -> None:
+        super().__init__()
+        self.name = name
+        self.ready = False
+        self.hand = []
+
+    def takeCard(self, cards):
+        self.hand.append(cards.pop())
+
+    def toString(self):
+        c = "[ \n\t"
+        for card in self.hand:
+            c += "\t" + card.toString() + " \n\t"
+        c += " ]"
+        return ("Player " + self.name + " { \n\tcards: " + c + "\n}")
+
+    def toClientString(self):
+        c = "[ \n\t"
+        for card in self.hand:
+            c += "\t" + card.toClientString() + " \n\t"
+        c += " ]"
+        return ("Player " + self.name + " { \n\tcards: " + c + "\n}")
 
-from constants import DATASIZE
 
 # Generic object
 class GameData(object):
@@ -10,23 +63,83 @@ class GameData(object):
         self.sender = sender
 
     def serialize(self) -> bytes:
-        data = pickle.dumps(self)
+        data = codec.encode(self)
         datalen = len(data)
-        binaryDataLen: bytes  = datalen.to_bytes(2, 'little')
-        totdata = bytearray(binaryDataLen) + data
-        #ensure no multiple data on same request
-        for _ in range(datalen + len(binaryDataLen), DATASIZE):
-            totdata.append(0)
-        data = bytes(totdata)
-        assert(len(data) == DATASIZE)
-        return data
+        if datalen > MAX_DATASIZE:
+            raise ValueError(f"Message too big: {datalen} bytes")
+        return datalen.to_bytes(HEADER_SIZE, 'little') + data
 
     def deserialize(serialized: bytes):
-        binarySize = serialized[0:2]
-        assert(len(binarySize) == 2)
-        datasize = int.from_bytes(binarySize, 'little')
-        data = serialized[2:datasize + 2]
-        return pickle.loads(data)
+        datasize = int.from_bytes(serialized[0:HEADER_SIZE], 'little')
+        data = serialized[HEADER_SIZE:datasize + HEADER_SIZE]
+        assert(len(data) == datasize)
+        return codec.decode(data)
+
+
+def sendData(sock, *data: GameData) -> None:
+    '''
+    Send one or more messages to the socket with a single write.
+    '''
+    sock.sendall(b"".join(d.serialize() for d in data))
+
+
+async def receiveData(reader):
+    '''
+    Waits for the next whole message of an asyncio stream and returns it.
+    Returns None if the connection was closed or the stream can't be parsed anymore
+    (raises ValueError if just this message is malformed).
+    '''
+    # only the server uses asyncio: the clients don't pay for importing it
+    import asyncio
+
+    try:
+        header = await reader.readexactly(HEADER_SIZE)
+        datasize = int.from_bytes(header, 'little')
+        if datasize > MAX_DATASIZE:
+            return None
+        return GameData.deserialize(header + await reader.readexactly(datasize))
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+
+
+class DataReader(object):
+    '''
+    Reassembles the messages received from a socket: TCP can split a message in many reads
+    or merge many messages in a single read.
+    '''
+    def __init__(self, sock) -> None:
+        super().__init__()
+        self.sock = sock
+        self.buffer = bytearray()
+
+    def read(self):
+        '''
+        Blocks until a whole message is received and returns it.
+        Returns None if the connection was closed.
+        '''
+        while True:
+            data = self.next()
+            if data is not None:
+                return data
+            chunk = self.sock.recv(DATASIZE)
+            if not chunk:
+                return None
+            self.buffer += chunk
+
+    def next(self):
+        '''
+        Returns the next message already in the buffer, or None if it's not complete yet.
+        '''
+        if len(self.buffer) < HEADER_SIZE:
+            return None
+        datasize = int.from_bytes(self.buffer[0:HEADER_SIZE], 'little')
+        if datasize > MAX_DATASIZE:
+            raise ValueError(f"Message too big: {datasize} bytes")
+        if len(self.buffer) < HEADER_SIZE + datasize:
+            return None
+        serialized = bytes(self.buffer[0:HEADER_SIZE + datasize])
+        del self.buffer[0:HEADER_SIZE + datasize]
+        return GameData.deserialize(serialized)
 
 
 # Client to server
@@ -55,9 +168,11 @@ class ClientPlayerAddData(ClientToServerData):
     '''
     A connection request from client to server.
     The client requests the server to be added to the lobby.
+    room: the name of the room to join (None to let the server choose one).
     '''
-    def __init__(self, sender) -> None:
+    def __init__(self, sender, room: str = None) -> None:
         action = "Connection request"
+        self.room = room
         super().__init__(sender, action)
 
 class ClientPlayerStartRequest(ClientToServerData):
@@ -143,10 +258,12 @@ class ServerPlayerConnectionOk(ServerToClientData):
     '''
     Server successfully received the connection request from the player.
     You need to tell the server that you are ready.
+    room: the name of the room joined by the player.
     '''
-    def __init__(self, playerName) -> None:
+    def __init__(self, playerName, room: str = None) -> None:
         action = "Connection ok"
         self.message = "Player " + str(playerName) + " connected succesfully!"
+        self.room = room
         super().__init__(action)
 
 class ServerPlayerStartRequestAccepted(ServerToClientData):
@@ -204,9 +321,10 @@ class ServerActionValid(ServerToClientData):
     action: the actino occurred. Now it is only "discard".
     move: the last move that occurred.
     cardHandIndex: the card index of the lastPlayer played card, given his hand order.
+    drawnCard: the card drawn by lastPlayer (None if the deck was empty, or for lastPlayer himself).
     '''
     # ! ADDED send also length of hand of lastPlayer so to know if drawing occured
-    def __init__(self, player: str, lastPlayer: str, action: str, card, cardHandIndex: int, handLength=0) -> None:
+    def __init__(self, player: str, lastPlayer: str, action: str, card, cardHandIndex: int, handLength=0, drawnCard=None) -> None:
         # action = "Valid action performed" #! BUGFIX You are overwriting the action e.g. "discard", so we lose what happened
         self.action = action
         self.card = card
@@ -215,6 +333,7 @@ class ServerActionValid(ServerToClientData):
         self.player = player
         # ! ADDED send also length of hand of lastPlayer so to know if drawing occured i.e. you know if there are cards left in the deck
         self.handLength = handLength
+        self.drawnCard = drawnCard
         super().__init__(action)
 
 
@@ -225,9 +344,10 @@ class ServerPlayerMoveOk(ServerToClientData):
     lastPlayer: the player that made the last move.
     card: the last card played.
     cardHandIndex: the card index of the lastPlayer played card, given his hand order.
+    drawnCard: the card drawn by lastPlayer (None if the deck was empty, or for lastPlayer himself).
     '''
     # ! ADDED send also length of hand of lastPlayer so to know if drawing occured
-    def __init__(self, player: str, lastPlayer: str, card, cardHandIndex: int, handLength: int) -> None:
+    def __init__(self, player: str, lastPlayer: str, card, cardHandIndex: int, handLength: int, drawnCard=None) -> None:
         action = "Correct move! Well done!"
         self.card = card
         self.cardHandIndex = cardHandIndex
@@ -235,6 +355,7 @@ class ServerPlayerMoveOk(ServerToClientData):
         self.player = player
         # ! ADDED send also length of hand of lastPlayer so to know if drawing occured
         self.handLength = handLength
+        self.drawnCard = drawnCard
         super().__init__(action)
 
 
@@ -246,9 +367,10 @@ class ServerPlayerThunderStrike(ServerToClientData):
     lastPlayer: the player that made the last move.
     card: the card that was just discarded.
     cardHandIndex: the card index of the lastPlayer played card, given his hand order.
+    drawnCard: the card drawn by lastPlayer (None if the deck was empty, or for lastPlayer himself).
     '''
     # ! ADDED send also length of hand of lastPlayer so to know if drawing occured
-    def __init__(self, player: str, lastPlayer: str, card, cardHandIndex: int, handLength: int) -> None:
+    def __init__(self, player: str, lastPlayer: str, card, cardHandIndex: int, handLength: int, drawnCard=None) -> None:
         action = "The Gods are angry at you!"
         self.player = player
         self.lastPlayer = lastPlayer
@@ -256,6 +378,7 @@ class ServerPlayerThunderStrike(ServerToClientData):
         self.card = card
         # ! ADDED send also length of hand of lastPlayer so to know if drawing occured
         self.handLength = handLength
+        self.drawnCard = drawnCard
         super().__init__(action)
 
 class ServerActionInvalid(ServerToClientData):
@@ -271,7 +394,7 @@ class ServerActionInvalid(ServerToClientData):
 class ServerInvalidDataReceived(ServerToClientData):
     '''
     Action not performed because of invalid data. turn is not changed.
-    data: the invalid data received.
+    data: a description of the invalid data received.
     '''
     def __init__(self, data) -> None:
         action = "Invalid data received"
@@ -290,4 +413,8 @@ class ServerGameOver(ServerToClientData):
         self.message = "Game over"
         self.score = score
         self.scoreMessage = scoreMessage
-        super().__init__(action)
\ No newline at end of file
+        super().__init__(action)
+
+
+# the codec encodes the messages above (it doesn't import this module)
+codec.register(Card, Player, ClientToServerData.__subclasses__() + ServerToClientData.__subclasses__())
@@ -1,24 +1,45 @@
 #!/usr/bin/env python3
-from sys import argv, stdout
+from sys import argv
 from threading import Thread, Condition
 import GameData
+import importlib
+import logging
 import socket
 from constants import *
-from agent import Agent, DEBUG, VERBOSE
-import traceback
+from logpipeline import setup_logging, stop_logging
+
+log = logging.getLogger("agent-client")
 
 
 def main():
-    if len(argv) < 4:
-        print("You need the player name to start the game.")
+    # The agent module pulls in NumPy and the whole search: it's imported by a background thread
+    # while the client connects and waits in the lobby, instead of before connecting
+    agent_import = Thread(target=importlib.import_module, args=("agent",), daemon=True)
+    agent_import.start()
+    # at the INFO level no message of the game loop is formatted: every move is logged at the DEBUG level
+    setup_logging(LOG_LEVEL, fmt="%(message)s")
+    # thin mode: --service[=path] runs the searches in the decision service (see decision_service.py)
+    service = None
+    args = []
+    for arg in argv:
+        if arg == "--service":
+            service = DECISION_SOCKET
+        elif arg.startswith("--service="):
+            service = arg[len("--service="):]
+        else:
+            args.append(arg)
+    if len(args) < 4:
+        log.warning("You need the player name to start the game.")
         # exit(-1)
         agent_name = "Test"  # For debug
         ip = HOST
         port = PORT
     else:
-        agent_name = argv[3]
-        ip = argv[1]
-        port = int(argv[2])
+        agent_name = args[3]
+        ip = args[1]
+        port = int(args[2])
+    # optional room to join, otherwise the server chooses one
+    room = args[4] if len(args) > 4 else None
 
     players = []
     agent = None
@@ -31,7 +52,7 @@ def main():
         Called to send a `show` request to the server
         """
         if status == statuses[1]:
-            s.send(GameData.ClientGetGameStateRequest(agent_name).serialize())
+            GameData.sendData(s, GameData.ClientGetGameStateRequest(agent_name))
 
     def agent_move_thread():
         """
@@ -40,33 +61,27 @@ def main():
         """
         with cv:
             while run:
-                if DEBUG or VERBOSE:
-                    print("waiting on cv")
+                log.debug("waiting on cv")
                 cv.wait()  # wait for our turn
                 if not run:
                     break
-                print(agent.known_status())
-                if DEBUG or VERBOSE:
-                    print("cv notified!")
+                # the knowledge is formatted only if it's going to be written
+                if log.isEnabledFor(logging.DEBUG):
+                    log.debug("%s", agent.known_status())
+                log.debug("cv notified!")
                 try:
                     move = agent.make_move()
                     if move is not None:
-                        if True:
-                            print(
-                                f"At turn {agent.turn} I chose the move: {move.action}:"
-                            )
-                            if hasattr(move, "handCardOrdered"):
-                                print(f"\tCard: {move.handCardOrdered}")
-                            if hasattr(move, "type") and hasattr(move, "value"):
-                                print(
-                                    f"\tHint: {move.type} {move.value} to {move.destination}"
-                                )
-                    elif move is None:
-                        print("MOVE IS NONE")
-                    s.send(move.serialize())
+                        log.debug("At turn %d I chose the move: %s:", agent.turn, move.action)
+                        if hasattr(move, "handCardOrdered"):
+                            log.debug("\tCard: %d", move.handCardOrdered)
+                        if hasattr(move, "type") and hasattr(move, "value"):
+                            log.debug("\tHint: %s %s to %s", move.type, move.value, move.destination)
+                    else:
+                        log.error("MOVE IS NONE")
+                    GameData.sendData(s, move)
                 except Exception:
-                    print(traceback.format_exc())
-                stdout.flush()
+                    log.exception("The agent could not make a move")
 
     def check_agent_turn(current_player: str):
         """
@@ -79,66 +94,70 @@ def main():
             with cv:
                 cv.notify()
 
-    def check_turn_and_new_cards(agent_obj: Agent, new_card_drawn: bool, last_player: str, current_player: str) -> None:
+    def check_turn_and_new_cards(agent_obj: "Agent", data: GameData.ServerToClientData) -> None:
         """
         Performs the right action based on the last action performed by some player.
 
         Args:
             agent_obj: the object of class Agent
-            new_card_drawn: it's False if the deck was empty and who played couldn't draw a new card
-            last_player: the name of the last player
-            current_player: the name of the player whose turn is
+            data: the ServerActionValid, ServerPlayerMoveOk or ServerPlayerThunderStrike received
         """
-        if last_player == agent_obj.name:
+        # it's False if the deck was empty and who played couldn't draw a new card
+        new_card_drawn = data.handLength == agent_obj.hand_size
+        if data.lastPlayer == agent_obj.name:
             if new_card_drawn:
                 agent_obj.draw_card()
-            print("Current player: " + current_player)
+            log.debug("Current player: %s", data.player)
         else:
-            if new_card_drawn:
+            if new_card_drawn and data.drawnCard is not None:
+                # the server pushed the drawn card: no need to ask for the game state
+                agent_obj.track_card_drawn_by(data.lastPlayer, data.drawnCard)
+                check_agent_turn(data.player)
+            elif new_card_drawn:
                 # trigger a check for the new drawn card and the next player
                 show_action()
             else:
-                check_agent_turn(current_player)
+                check_agent_turn(data.player)
 
     with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        request = GameData.ClientPlayerAddData(agent_name)
+        request = GameData.ClientPlayerAddData(agent_name, room)
         s.connect((ip, port))
-        s.send(request.serialize())
-        data = s.recv(DATASIZE)
-        data = GameData.GameData.deserialize(data)
+        reader = GameData.DataReader(s)
+        GameData.sendData(s, request)
+        data = reader.read()
         if type(data) is GameData.ServerPlayerConnectionOk:
-            if DEBUG:
-                print("Connection accepted by the server. Welcome " + agent_name)
-            s.send(GameData.ClientPlayerStartRequest(agent_name).serialize())
+            log.info("Connection accepted by the server. Welcome %s to room %s", agent_name, data.room)
+            GameData.sendData(s, GameData.ClientPlayerStartRequest(agent_name))
 
         cv = Condition()
         Thread(target=agent_move_thread).start()
         while run:
             dataOk = False
-            data = s.recv(DATASIZE)
-            if not data:
-                continue
-            data = GameData.GameData.deserialize(data)
+            data = reader.read()
+            if data is None:
+                log.info("Connection closed by the server")
+                run = False
+                with cv:
+                    cv.notify()
+                break
 
             # 1 received when one player send the "ready"
             if type(data) is GameData.ServerPlayerStartRequestAccepted:
                 dataOk = True
-                if DEBUG:
-                    print(
-                        "Ready: "
-                        + str(data.acceptedStartRequests)
-                        + "/"
-                        + str(data.connectedPlayers)
-                        + " players"
-                    )
+                log.debug("Ready: %d/%d players", data.acceptedStartRequests, data.connectedPlayers)
 
             # 2 received when all players are ready
             if type(data) is GameData.ServerStartGameData:
                 dataOk = True
-                print("Game start!")
+                log.info("Game start!")
 
                 players = data.players
-                s.send(GameData.ClientPlayerReadyData(agent_name).serialize())
+                agent_import.join()
+                from agent import Agent, DEBUG, VERBOSE
+
+                if DEBUG or VERBOSE:
+                    logging.getLogger().setLevel(logging.DEBUG)
+                GameData.sendData(s, GameData.ClientPlayerReadyData(agent_name))
                 status = statuses[1]
                 # first call -> will initialize the agent and its structures
                 show_action()
@@ -148,7 +167,12 @@ def main():
                 dataOk = True
 
                 if agent is None:
-                    agent = Agent(agent_name, data, players)
+                    decision_client = None
+                    if service is not None:
+                        from decision_service import DecisionClient
+
+                        decision_client = DecisionClient(service)
+                    agent = Agent(agent_name, data, players, decision_client=decision_client)
                 else:
                     agent.track_drawn_card(data.players)
                 agent.assert_aligned_with_server(
@@ -164,9 +188,7 @@ def main():
             if type(data) is GameData.ServerActionInvalid:
                 dataOk = True
                 # something is wrong, shouldn't be here
-                print("Invalid action performed. Reason:")
-                print(data.message)
-                stdout.flush()
+                log.error("Invalid action performed. Reason: %s", data.message)
                 run = False
                 # decrement turn because this notify will make the agent take another decision (in the current turn)
                 # in the make_move, which by default increments the turns count
@@ -177,24 +199,19 @@ def main():
             # 5 received when one player discards a card
             if type(data) is GameData.ServerActionValid:
                 dataOk = True
-                print("Action valid!")
+                log.debug("Action valid!")
 
                 if data.lastPlayer == agent_name:
                     agent.discover_own_card(data.card, data.cardHandIndex)
 
                 agent.track_discarded_card(data.lastPlayer, data.cardHandIndex)
 
-                check_turn_and_new_cards(
-                    agent,
-                    data.handLength == agent.hand_size,
-                    data.lastPlayer,
-                    data.player,
-                )
+                check_turn_and_new_cards(agent, data)
 
             # 6 received when one player plays a card correctly
             if type(data) is GameData.ServerPlayerMoveOk:
                 dataOk = True
-                print("Nice move!")
+                log.debug("Nice move!")
 
                 if data.lastPlayer == agent_name:
                     agent.discover_own_card(data.card, data.cardHandIndex)
@@ -203,17 +220,12 @@ def main():
                     data.lastPlayer, data.cardHandIndex, correctly=True
                 )
 
-                check_turn_and_new_cards(
-                    agent,
-                    data.handLength == agent.hand_size,
-                    data.lastPlayer,
-                    data.player,
-                )
+                check_turn_and_new_cards(agent, data)
 
             # 7 received when one player makes a mistake
             if type(data) is GameData.ServerPlayerThunderStrike:
                 dataOk = True
-                print("OH NO! The Gods are unhappy with you!")
+                log.debug("OH NO! The Gods are unhappy with you!")
 
                 if data.lastPlayer == agent_name:
                     agent.discover_own_card(data.card, data.cardHandIndex)
@@ -222,27 +234,18 @@ def main():
                     data.lastPlayer, data.cardHandIndex, correctly=False
                 )
 
-                check_turn_and_new_cards(
-                    agent,
-                    data.handLength == agent.hand_size,
-                    data.lastPlayer,
-                    data.player,
-                )
+                check_turn_and_new_cards(agent, data)
 
             # 8 received when one player hints another player
             if type(data) is GameData.ServerHintData:
                 dataOk = True
-                if DEBUG:
-                    print("Hint type: " + data.type)
-                    print(
-                        "Player "
-                        + data.destination
-                        + " cards with value "
-                        + str(data.value)
-                        + " are:"
-                    )
-                    for i in data.positions:
-                        print("\t" + str(i))
+                log.debug(
+                    "Hint type: %s\nPlayer %s cards with value %s are: %s",
+                    data.type,
+                    data.destination,
+                    data.value,
+                    data.positions,
+                )
 
                 agent.track_hint(
                     data.destination, data.positions, data.type, data.value
@@ -253,8 +256,7 @@ def main():
             # 9 received when the agent performs an action against the game rules (?)
             if type(data) is GameData.ServerInvalidDataReceived:
                 dataOk = True
-                if DEBUG:
-                    print(data.data)
+                log.warning("Invalid data: %s", data.data)
                 # decrement turn because this notify will make the agent take another decision (in the current turn)
                 # in the make_move, which by default increments the turns count
                 agent.turn -= 1
@@ -265,19 +267,17 @@ def main():
             # 10 received when the game is over for some reason
             if type(data) is GameData.ServerGameOver:
                 dataOk = True
-                print(data.message)
-                print(data.score)
-                print(data.scoreMessage)
-                stdout.flush()
+                log.info("%s\n%d\n%s", data.message, data.score, data.scoreMessage)
                 run = False
                 with cv:
                     cv.notify()
 
             if not dataOk:
-                print("Unknown or unimplemented data type: " + str(type(data)))
-            # print("[" + agent_name + " - " + status + "]: ", end="")
-            stdout.flush()
+                log.warning("Unknown or unimplemented data type: %s", type(data))
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    finally:
+        stop_logging()
@@ -1,25 +1,55 @@
-from typing import List, Any
+from typing import List, Any, Optional
 import random
+import time
 import numpy as np
 from constants import SEED
 from game_state import GameState
 from utils import Card, Color, color_enum2str, color_str2enum
+from game_move import GameMove
 from mcts import MCTS
+from endgame import EndgameSolver
 import GameData
-from hyperparameters import MCTS_ITERATIONS, MCTS_TIME_BUDGET
+from hyperparameters import Hyperparameters
 
 DEBUG = False
-VERBOSE = True
+VERBOSE = False
 LOG = False
 
 
 class Agent:
+    # fraction of mcts_time_budget the endgame solver can use before the search takes over
+    ENDGAME_BUDGET_FRACTION = 0.5
+
     def __init__(
-        self, name: str, data: GameData.ServerGameStateData, players_names: list
+        self,
+        name: str,
+        data: GameData.ServerGameStateData,
+        players_names: list,
+        params: Hyperparameters = None,
+        decision_client: Any = None,
     ) -> None:
+        """
+        Args:
+            name: the name of the agent
+            data: the server game state to use to initialize the agent's knowledge
+            players_names: the list of the player names in turn order
+            params: the hyperparameters of the agent (None for the default ones)
+            decision_client: a decision_service.DecisionClient: if given, the searches run in the decision service
+        """
         self.name = name
+        self.params = params if params is not None else Hyperparameters()
+        self.decision_client = decision_client
         self._game_state = GameState(players_names, name, data)
         self.turn = 0
+        self.last_search_iterations = 0
+        self.last_tree_nodes = 0
+        self.last_tree_bytes = 0
+        # the hands re-determinized and reused during the selection of the last search, and the time spent on them
+        self.last_redeterminizations = 0
+        self.last_reused_determinizations = 0
+        self.last_redeterminization_time = 0.0
+        # the states evaluated by the endgame solver for the last move (None if the move was searched)
+        self.last_endgame_states = None
         self.hand_size = 5 if len(players_names) < 4 else 4
         if SEED is not None:
             np.random.seed(SEED)
@@ -27,11 +57,38 @@ class Agent:
 
     def make_move(self) -> GameData.ClientToServerData:
         """
-        Runs the MCTS and returns the GameData.ClientToServerData object corresponding to the action chosen.
+        Runs the MCTS (in the decision service, if the agent has a client of it), or the endgame solver
+        when the deck is nearly empty, and returns the GameData.ClientToServerData object corresponding
+        to the action chosen.
         """
         self.turn += 1
-        mcts = MCTS(self._game_state, self.name)
-        move = mcts.run_search(time_budget=MCTS_TIME_BUDGET, iterations=MCTS_ITERATIONS)
+        self.last_endgame_states = None
+        start_time = time.time()
+        move = self._solve_endgame(start_time)
+        params = self.params
+        if move is None and params.mcts_time_budget is not None:
+            # the search gets the time the endgame solver left
+            params = params.replace(mcts_time_budget=params.mcts_time_budget - (time.time() - start_time))
+        if move is None and self.decision_client is not None:
+            move, stats = self.decision_client.decide(self._game_state, self.name, params)
+            self.last_search_iterations = stats["iterations"]
+            self.last_tree_nodes = stats["tree_nodes"]
+            self.last_tree_bytes = stats["tree_bytes"]
+            self.last_redeterminizations = stats["redeterminizations"]
+            self.last_reused_determinizations = stats["reused_determinizations"]
+            self.last_redeterminization_time = stats["redeterminization_time"]
+        elif move is None:
+            mcts = MCTS(self._game_state, self.name, params)
+            move = mcts.run_search(
+                time_budget=params.mcts_time_budget,
+                iterations=params.mcts_iterations,
+            )
+            self.last_search_iterations = mcts.iterations
+            self.last_tree_nodes = len(mcts.tree)
+            self.last_tree_bytes = mcts.tree.nbytes()
+            self.last_redeterminizations = mcts.redeterminizations
+            self.last_reused_determinizations = mcts.reused_determinizations
+            self.last_redeterminization_time = mcts.redeterminization_time
         if move.action_type == "hint":
             hint_value = (
                 move.hint_value
@@ -48,6 +105,38 @@ class Agent:
         else:
             raise RuntimeError(f"Unknown action type received: {move.action_type}")
 
+    def _solve_endgame(self, start_time: float) -> Optional[GameMove]:
+        """
+        Returns the move of the endgame solver, or None if the game isn't in its endgame
+        (or the agent's hand has too many determinizations to solve it exactly,
+        or it isn't solved within ENDGAME_BUDGET_FRACTION of mcts_time_budget)
+
+        Args:
+            start_time: the time (as returned by time.time()) at which the decision started
+        """
+        if (
+            self.params.endgame_deck_size is None
+            or EndgameSolver.deck_size(self._game_state) > self.params.endgame_deck_size
+        ):
+            return None
+        solver = EndgameSolver(self._game_state, self.name, self.params)
+        deadline = (
+            start_time + self.ENDGAME_BUDGET_FRACTION * self.params.mcts_time_budget
+            if self.params.mcts_time_budget is not None
+            else None
+        )
+        solution = solver.solve(deadline)
+        if solution is None:
+            return None
+        self.last_endgame_states = solver.states
+        self.last_search_iterations = 0
+        self.last_tree_nodes = 0
+        self.last_tree_bytes = 0
+        self.last_redeterminizations = 0
+        self.last_reused_determinizations = 0
+        self.last_redeterminization_time = 0.0
+        return solution[0]
+
     def discover_own_card(self, card, card_idx: int) -> None:
         """
         Called whenever the agent plays or discards a card, this function update the deck knowledge if the discovered card is NOT fully determined.
@@ -69,9 +158,20 @@ class Agent:
     def track_played_card(self, player: str, card_idx: int, correctly: bool) -> None:
         self._game_state.card_played(player, card_idx, correctly)
 
+    def track_card_drawn_by(self, player: str, card: Any) -> None:
+        """
+        Track a card drawn by another player from the deck, as pushed by the server with the play or the discard
+
+        Args:
+            player: the name of the player who drew the card
+            card: the drawn card (a game.Card)
+        """
+        assert player != self.name, "Cannot discover my cards"
+        self._game_state.card_drawn(player, Card.from_server(card))
+
     def track_drawn_card(self, players: list) -> None:
         """
-        Track a card drawn by another player form the deck
+        Track a card drawn by another player form the deck, by comparing the hands with a full game state
         """
         different_hands = 0
         new_card = None
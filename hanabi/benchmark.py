@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+import argparse
+import copy
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from game_state import GameState, MCTSState
+from hyperparameters import Hyperparameters
+from mcts import MCTS
+from model import Model
+from rules import Rules
+from selfplay import SelfPlayGame
+from utils import Card
+
+PLAYERS = [2, 3, 4, 5]
+# phase name -> maximum number of cards left in the (server) deck
+PHASES = {"early": 50, "mid": 20, "late": 3}
+FIXTURE_SEED = 0
+# cheap agents, only used to bring the fixtures to the desired phase
+FIXTURE_PARAMS = Hyperparameters(
+    mcts_time_budget=None, mcts_iterations=1, mcts_simulations=1
+)
+
+
+class Fixture:
+    """
+    A snapshot of a self-play game, taken at the beginning of a turn.
+
+    Attributes:
+        players:    the number of players
+        phase:      the phase of the game ("early", "mid" or "late")
+        state:      the knowledge of the current player
+        player:     the name of the current player
+    """
+
+    def __init__(self, players: int, phase: str, state: GameState, player: str) -> None:
+        self.players = players
+        self.phase = phase
+        self.state = state
+        self.player = player
+
+
+def build_fixture(players: int, phase: str, seed: int = FIXTURE_SEED) -> Fixture:
+    """
+    Play a seeded game with cheap agents until the deck is small enough for the phase.
+    If the game ends before, the next seed is used.
+
+    Args:
+        players: the number of players
+        phase: the phase of the game
+        seed: the first seed to try
+    """
+    while True:
+        game = SelfPlayGame(players, FIXTURE_PARAMS, seed)
+        while game.game.getDeckSize() > PHASES[phase] and game.step():
+            pass
+        if not game.is_over():
+            agent = game.agents[game.current_player]
+            return Fixture(
+                players, phase, copy.deepcopy(agent._game_state), agent.name
+            )
+        seed += 1
+
+
+def _seed(seed: int) -> None:
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def measure(
+    op: Callable,
+    setup: Callable[[], tuple] = tuple,
+    min_time: float = 0.5,
+    max_ops: int = 100000,
+    alloc_ops: int = 10,
+) -> Dict:
+    """
+    Time op(*setup()), excluding the setup, until min_time seconds of op have elapsed (or max_ops calls).
+    Then trace the memory of a few more calls.
+
+    Args:
+        op: the operation to measure
+        setup: returns the arguments of a single op call
+        min_time: the minimum measured time (in seconds)
+        max_ops: the maximum number of calls
+        alloc_ops: the number of calls traced for the allocations
+    """
+    _seed(FIXTURE_SEED)
+    samples = []
+    elapsed = 0.0
+    while elapsed < min_time and len(samples) < max_ops:
+        args = setup()
+        start_time = time.perf_counter()
+        op(*args)
+        sample = time.perf_counter() - start_time
+        samples.append(sample)
+        elapsed += sample
+
+    # allocations: peak traced memory and memory blocks left allocated by each call
+    peaks = []
+    blocks = []
+    tracemalloc.start()
+    for _ in range(alloc_ops):
+        args = setup()
+        tracemalloc.reset_peak()
+        base_memory, _ = tracemalloc.get_traced_memory()
+        base_blocks = sys.getallocatedblocks()
+        op(*args)
+        blocks.append(sys.getallocatedblocks() - base_blocks)
+        peaks.append(tracemalloc.get_traced_memory()[1] - base_memory)
+        del args
+    tracemalloc.stop()
+
+    return {
+        "ops": len(samples),
+        "ops_per_sec": len(samples) / elapsed,
+        "mean_us": 1e6 * statistics.mean(samples),
+        "median_us": 1e6 * statistics.median(samples),
+        "stdev_us": 1e6 * statistics.stdev(samples) if len(samples) > 1 else 0.0,
+        "alloc_peak_bytes": statistics.median(peaks),
+        "alloc_blocks": statistics.median(blocks),
+    }
+
+
+def _some_rank(state: GameState) -> int:
+    return next(r for r in range(1, 6) if np.any(state.deck[r, :] > 0))
+
+
+def _some_color(state: GameState) -> int:
+    return next(c for c in range(5) if np.any(state.deck[:, c] > 0))
+
+
+def benchmarks(fixture: Fixture) -> List[Tuple[str, Callable, Callable]]:
+    """
+    Returns the list of (name, op, setup) of the benchmarks on the given fixture
+    """
+    state = fixture.state
+    player = fixture.player
+    teammate = state.get_next_player_name(player)
+    mcts_state = MCTSState(state)
+    model = Model(mcts_state)
+    deck = copy.deepcopy(state.deck)
+    rank = _some_rank(state)
+    color = _some_color(state)
+
+    def deck_draw(rank=None, color=None):
+        if rank is not None or color is not None:
+            deck.reserve_semi_determined_cards(
+                [Card(rank, color, rank is not None, color is not None)]
+            )
+        card = deck.draw(rank=rank, color=color)
+        deck.reset_reservations()
+        deck.add_cards([card])
+
+    def redeterminize_restore():
+        model.redeterminize_hand(teammate)
+        model.restore_hand(teammate)
+
+    def rules_setup():
+        # _get_probabilities uses the mental state left in Rules by get_rules_moves
+        Rules.get_rules_moves(mcts_state, player)
+        return ()
+
+    def rules_probabilities():
+        Rules._get_probabilities(
+            mcts_state.hands[player], Rules._is_playable, mcts_state.board, mcts_state.trash
+        )
+
+    def model_copy():
+        return (copy.deepcopy(model),)
+
+    def new_search():
+        # a fresh tree for every sample, so that every sample times the same selection depth
+        return (MCTS(state, player),)
+
+    search = MCTS(state, player)
+
+    return [
+        ("Deck.draw", deck_draw, tuple),
+        ("Deck.draw(rank)", lambda: deck_draw(rank=rank), tuple),
+        ("Deck.draw(color)", lambda: deck_draw(color=color), tuple),
+        ("MCTSState.__init__", lambda: MCTSState(state), tuple),
+        ("redeterminize_hand+restore_hand", redeterminize_restore, tuple),
+        ("Rules.get_rules_moves", lambda: Rules.get_rules_moves(mcts_state, player), tuple),
+        ("Rules._get_probabilities", rules_probabilities, rules_setup),
+        ("Model.make_random_move", lambda m: m.make_random_move(player), model_copy),
+        ("copy.deepcopy(Model)", lambda: copy.deepcopy(model), tuple),
+        ("MCTS._simulate", lambda m: search._simulate(search.tree.get_root(), m), model_copy),
+        ("MCTS._run_search_iteration", lambda s: s._run_search_iteration(), new_search),
+    ]
+
+
+def run(
+    players: List[int], phases: List[str], names: Optional[List[str]], min_time: float
+) -> Dict:
+    """
+    Run every benchmark on every fixture and return the report
+
+    Args:
+        players: the numbers of players of the fixtures
+        phases: the phases of the fixtures
+        names: run only the benchmarks whose name contains one of these (None for all)
+        min_time: the minimum measured time of each benchmark
+    """
+    results = []
+    for n in players:
+        for phase in phases:
+            fixture = build_fixture(n, phase)
+            for name, op, setup in benchmarks(fixture):
+                if names is not None and not any(s in name for s in names):
+                    continue
+                result = {"name": name, "players": n, "phase": phase}
+                result.update(measure(op, setup, min_time))
+                results.append(result)
+                print(
+                    f"{name:<32} {n}p {phase:<5} {result['ops_per_sec']:>12.1f} ops/s "
+                    f"{result['alloc_peak_bytes']:>10.0f} B peak"
+                )
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "fixture_seed": FIXTURE_SEED,
+        "results": results,
+    }
+
+
+def compare(old_path: str, new_path: str) -> None:
+    """
+    Print the speed-up of every benchmark of the second report with respect to the first one
+    """
+    with open(old_path) as f:
+        old = {(r["name"], r["players"], r["phase"]): r for r in json.load(f)["results"]}
+    with open(new_path) as f:
+        new = json.load(f)["results"]
+    print(f"{'benchmark':<32} {'fixture':<9} {'old ops/s':>12} {'new ops/s':>12} {'speed-up':>9} {'alloc':>7}")
+    for r in new:
+        key = (r["name"], r["players"], r["phase"])
+        if key not in old:
+            continue
+        o = old[key]
+        speedup = r["ops_per_sec"] / o["ops_per_sec"]
+        alloc = r["alloc_peak_bytes"] / o["alloc_peak_bytes"] if o["alloc_peak_bytes"] else 1.0
+        print(
+            f"{r['name']:<32} {r['players']}p {r['phase']:<6} {o['ops_per_sec']:>12.1f} "
+            f"{r['ops_per_sec']:>12.1f} {speedup:>8.2f}x {alloc:>6.2f}x"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the agent's hot primitives")
+    parser.add_argument("-p", "--players", type=int, nargs="+", default=PLAYERS, help="numbers of players")
+    parser.add_argument("--phases", nargs="+", default=list(PHASES), choices=list(PHASES), help="phases of the game")
+    parser.add_argument("-b", "--bench", nargs="+", default=None, help="run only the benchmarks matching these names")
+    parser.add_argument("-t", "--min-time", type=float, default=0.5, help="measured seconds per benchmark")
+    parser.add_argument("-o", "--output", default="benchmark.json", help="file where the results are written")
+    parser.add_argument("-c", "--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files")
+    args = parser.parse_args()
+
+    if args.compare is not None:
+        compare(*args.compare)
+        return
+    report = run(args.players, args.phases, args.bench, args.min_time)
+    with open(args.output, "w") as out:
+        json.dump(report, out, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -18,6 +18,8 @@ else:
     playerName = argv[3]
     ip = argv[1]
     port = int(argv[2])
+# optional room to join, otherwise the server chooses one
+room = argv[4] if len(argv) > 4 else None
 
 run = True
 
@@ -37,14 +39,14 @@ def manageInput():
             run = False
             os._exit(0)
         elif command == "ready" and status == statuses[0]:
-            s.send(GameData.ClientPlayerStartRequest(playerName).serialize())
+            GameData.sendData(s, GameData.ClientPlayerStartRequest(playerName))
         elif command == "show" and status == statuses[1]:
-            s.send(GameData.ClientGetGameStateRequest(playerName).serialize())
+            GameData.sendData(s, GameData.ClientGetGameStateRequest(playerName))
         elif command.split(" ")[0] == "discard" and status == statuses[1]:
             try:
                 cardStr = command.split(" ")
                 cardOrder = int(cardStr[1])
-                s.send(GameData.ClientPlayerDiscardCardRequest(playerName, cardOrder).serialize())
+                GameData.sendData(s, GameData.ClientPlayerDiscardCardRequest(playerName, cardOrder))
             except:
                 print("Maybe you wanted to type 'discard <num>'?")
                 continue
@@ -52,7 +54,7 @@ def manageInput():
             try:
                 cardStr = command.split(" ")
                 cardOrder = int(cardStr[1])
-                s.send(GameData.ClientPlayerPlayCardRequest(playerName, cardOrder).serialize())
+                GameData.sendData(s, GameData.ClientPlayerPlayCardRequest(playerName, cardOrder))
             except:
                 print("Maybe you wanted to type 'play <num>'?")
                 continue
@@ -73,7 +75,7 @@ def manageInput():
                     if value not in ["green", "red", "blue", "yellow", "white"]:
                         print("Error: card color can only be green, red, blue, yellow or white")
                         continue
-                s.send(GameData.ClientHintData(playerName, destination, t, value).serialize())
+                GameData.sendData(s, GameData.ClientHintData(playerName, destination, t, value))
             except:
                 print("Maybe you wanted to type 'hint <type> <destinatary> <value>'?")
                 continue
@@ -85,31 +87,30 @@ def manageInput():
         stdout.flush()
 
 with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-    request = GameData.ClientPlayerAddData(playerName)
+    request = GameData.ClientPlayerAddData(playerName, room)
     s.connect((HOST, PORT))
-    s.send(request.serialize())
-    data = s.recv(DATASIZE)
-    data = GameData.GameData.deserialize(data)
+    reader = GameData.DataReader(s)
+    GameData.sendData(s, request)
+    data = reader.read()
     if type(data) is GameData.ServerPlayerConnectionOk:
-        print("Connection accepted by the server. Welcome " + playerName)
+        print("Connection accepted by the server. Welcome " + playerName + " to room " + str(data.room))
     print("[" + playerName + " - " + status + "]: ", end="")
     Thread(target=manageInput).start()
     while run:
         dataOk = False
-        data = s.recv(DATASIZE)
-        if not data:
-            continue
-        data = GameData.GameData.deserialize(data)
+        data = reader.read()
+        if data is None:
+            print("Connection closed by the server")
+            os._exit(0)
         print('data: ', data)
         if type(data) is GameData.ServerPlayerStartRequestAccepted:
             dataOk = True
             print("Ready: " + str(data.acceptedStartRequests) + "/"  + str(data.connectedPlayers) + " players")
-            data = s.recv(DATASIZE)
-            data = GameData.GameData.deserialize(data)
+            data = reader.read()
         if type(data) is GameData.ServerStartGameData:
             dataOk = True
             print("Game start!")
-            s.send(GameData.ClientPlayerReadyData(playerName).serialize())
+            GameData.sendData(s, GameData.ClientPlayerReadyData(playerName))
             status = statuses[1]
         if type(data) is GameData.ServerGameStateData:
             dataOk = True
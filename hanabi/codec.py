@@ -0,0 +1,396 @@
+# Binary encoding of the GameData messages
+import inspect
+import struct
+
+# Every payload starts with the codec version and the tag of the message type,
+# followed by the fields listed in the schema of that type, in order.
+# The codec doesn't import the message classes: GameData, which uses the codec, registers them (see register).
+VERSION = 3
+COLORS = ("red", "yellow", "green", "blue", "white")
+
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+_I16 = struct.Struct("<h")
+_HEADER = struct.Struct("<BB")
+_CARD = struct.Struct("<BBB")  # id, value, color index
+
+# value of a hint: a rank or a color
+_VALUE_INT = 0
+_VALUE_STR = 1
+_VALUE_NONE = 2
+
+_color_index = {color: i for i, color in enumerate(COLORS)}
+
+
+def _encode_str(out: bytearray, s: str) -> None:
+    data = s.encode("utf-8")
+    out += _U16.pack(len(data))
+    out += data
+
+
+def _decode_str(buf: bytes, offset: int):
+    (size,) = _U16.unpack_from(buf, offset)
+    offset += _U16.size
+    if offset + size > len(buf):
+        raise ValueError("Truncated string")
+    return buf[offset:offset + size].decode("utf-8"), offset + size
+
+
+def _encode_optional_str(out: bytearray, s: str) -> None:
+    if s is None:
+        out += _U8.pack(0)
+    else:
+        out += _U8.pack(1)
+        _encode_str(out, s)
+
+
+def _decode_optional_str(buf: bytes, offset: int):
+    if buf[offset] == 0:
+        return None, offset + _U8.size
+    return _decode_str(buf, offset + _U8.size)
+
+
+def _encode_int(out: bytearray, n: int) -> None:
+    out += _I16.pack(n)
+
+
+def _decode_int(buf: bytes, offset: int):
+    return _I16.unpack_from(buf, offset)[0], offset + _I16.size
+
+
+def _encode_bool(out: bytearray, b: bool) -> None:
+    out += _U8.pack(bool(b))
+
+
+def _decode_bool(buf: bytes, offset: int):
+    return bool(_U8.unpack_from(buf, offset)[0]), offset + _U8.size
+
+
+def _encode_value(out: bytearray, value) -> None:
+    if value is None:
+        out += _U8.pack(_VALUE_NONE)
+    elif isinstance(value, int):
+        out += _U8.pack(_VALUE_INT)
+        out += _I16.pack(value)
+    elif isinstance(value, str):
+        out += _U8.pack(_VALUE_STR)
+        _encode_str(out, value)
+    else:
+        raise ValueError(f"Cannot encode hint value {value!r}")
+
+
+def _decode_value(buf: bytes, offset: int):
+    (kind,) = _U8.unpack_from(buf, offset)
+    offset += _U8.size
+    if kind == _VALUE_INT:
+        return _decode_int(buf, offset)
+    if kind == _VALUE_STR:
+        return _decode_str(buf, offset)
+    if kind == _VALUE_NONE:
+        return None, offset
+    raise ValueError(f"Unknown value kind {kind}")
+
+
+def _encode_card(out: bytearray, card: "GameData.Card") -> None:
+    out += _CARD.pack(card.id, card.value, _color_index[card.color])
+
+
+# the types of the decoded cards and players (set by register)
+_card_type = None
+_player_type = None
+
+
+def _get_card(fields: bytes) -> "GameData.Card":
+    """
+    Returns a new card with the 3 bytes (id, value, color index): every message gets its own cards,
+    so a client modifying a received card doesn't change the other messages
+    """
+    if fields[2] >= len(COLORS):
+        raise ValueError(f"Unknown color index {fields[2]}")
+    return _card_type(fields[0], fields[1], COLORS[fields[2]])
+
+
+def _decode_card(buf: bytes, offset: int):
+    end = offset + _CARD.size
+    if end > len(buf):
+        raise ValueError("Truncated card")
+    return _get_card(buf[offset:end]), end
+
+
+def _encode_optional_card(out: bytearray, card: "GameData.Card") -> None:
+    if card is None:
+        out += _U8.pack(0)
+    else:
+        out += _U8.pack(1)
+        _encode_card(out, card)
+
+
+def _decode_optional_card(buf: bytes, offset: int):
+    if buf[offset] == 0:
+        return None, offset + _U8.size
+    return _decode_card(buf, offset + _U8.size)
+
+
+def _list_codec(encode_item, decode_item):
+    """
+    Returns the (encode, decode) functions of a list of at most 255 items
+    """
+
+    def encode(out: bytearray, items: list) -> None:
+        out += _U8.pack(len(items))
+        for item in items:
+            encode_item(out, item)
+
+    def decode(buf: bytes, offset: int):
+        (size,) = _U8.unpack_from(buf, offset)
+        offset += _U8.size
+        items = []
+        for _ in range(size):
+            item, offset = decode_item(buf, offset)
+            items.append(item)
+        return items, offset
+
+    return encode, decode
+
+
+_encode_strs, _decode_strs = _list_codec(_encode_str, _decode_str)
+
+
+# lists of small non negative numbers (e.g. hand positions), one byte each
+def _encode_ints(out: bytearray, items: list) -> None:
+    out += _U8.pack(len(items))
+    out += bytes(items)
+
+
+def _decode_ints(buf: bytes, offset: int):
+    end = offset + _U8.size + buf[offset]
+    if end > len(buf):
+        raise ValueError("Truncated list of numbers")
+    return list(buf[offset + _U8.size:end]), end
+
+
+def _encode_cards(out: bytearray, cards: list) -> None:
+    out += _U8.pack(len(cards))
+    for card in cards:
+        out += _CARD.pack(card.id, card.value, _color_index[card.color])
+
+
+def _decode_cards(buf: bytes, offset: int):
+    size = buf[offset]
+    offset += _U8.size
+    if size == 0:
+        return [], offset
+    end = offset + size * _CARD.size
+    if end > len(buf):
+        raise ValueError("Truncated list of cards")
+    return [_get_card(buf[i:i + _CARD.size]) for i in range(offset, end, _CARD.size)], end
+
+
+def _encode_player(out: bytearray, player: "GameData.Player") -> None:
+    _encode_str(out, player.name)
+    _encode_bool(out, player.ready)
+    _encode_cards(out, player.hand)
+
+
+def _decode_player(buf: bytes, offset: int):
+    player = _player_type.__new__(_player_type)
+    player.name, offset = _decode_str(buf, offset)
+    player.ready, offset = _decode_bool(buf, offset)
+    player.hand, offset = _decode_cards(buf, offset)
+    return player, offset
+
+
+_encode_players, _decode_players = _list_codec(_encode_player, _decode_player)
+
+
+def _encode_table(out: bytearray, table: dict) -> None:
+    out += _U8.pack(len(table))
+    for color, cards in table.items():
+        out += _U8.pack(_color_index[color])
+        _encode_cards(out, cards)
+
+
+def _decode_table(buf: bytes, offset: int):
+    size = buf[offset]
+    offset += _U8.size
+    table = {}
+    for _ in range(size):
+        color = buf[offset]
+        if color >= len(COLORS):
+            raise ValueError(f"Unknown color index {color}")
+        table[COLORS[color]], offset = _decode_cards(buf, offset + _U8.size)
+    return table, offset
+
+
+# field type -> (encode, decode)
+_FIELDS = {
+    "str": (_encode_str, _decode_str),
+    "optional str": (_encode_optional_str, _decode_optional_str),
+    "int": (_encode_int, _decode_int),
+    "value": (_encode_value, _decode_value),
+    "card": (_encode_card, _decode_card),
+    "optional card": (_encode_optional_card, _decode_optional_card),
+    "ints": (_encode_ints, _decode_ints),
+    "strs": (_encode_strs, _decode_strs),
+    "cards": (_encode_cards, _decode_cards),
+    "players": (_encode_players, _decode_players),
+    "table": (_encode_table, _decode_table),
+}
+
+# tag -> (name of the message type, [(attribute, field type)]).
+# Tags are part of the protocol: never reuse or renumber them, append new ones and bump VERSION
+# when the layout of an existing message changes.
+SCHEMAS = {
+    1: ("ClientHintData", [("sender", "str"), ("destination", "str"), ("type", "str"), ("value", "value")]),
+    2: ("ClientPlayerAddData", [("sender", "str"), ("room", "optional str")]),
+    3: ("ClientPlayerStartRequest", [("sender", "str")]),
+    4: ("ClientPlayerReadyData", [("sender", "str")]),
+    5: ("ClientGetGameStateRequest", [("sender", "str")]),
+    6: ("ClientPlayerDiscardCardRequest", [("sender", "str"), ("handCardOrdered", "int")]),
+    7: ("ClientPlayerPlayCardRequest", [("sender", "str"), ("handCardOrdered", "int")]),
+    20: (
+        "ServerHintData",
+        [("source", "str"), ("destination", "str"), ("type", "str"), ("value", "value"), ("positions", "ints"), ("player", "str")],
+    ),
+    21: ("ServerPlayerConnectionOk", [("message", "str"), ("room", "optional str")]),
+    22: ("ServerPlayerStartRequestAccepted", [("connectedPlayers", "int"), ("acceptedStartRequests", "int")]),
+    23: ("ServerStartGameData", [("players", "strs")]),
+    24: (
+        "ServerGameStateData",
+        [
+            ("currentPlayer", "str"),
+            ("handSize", "int"),
+            ("players", "players"),
+            ("usedNoteTokens", "int"),
+            ("usedStormTokens", "int"),
+            ("tableCards", "table"),
+            ("discardPile", "cards"),
+        ],
+    ),
+    25: (
+        "ServerActionValid",
+        [
+            ("player", "str"),
+            ("lastPlayer", "str"),
+            ("action", "str"),
+            ("card", "card"),
+            ("cardHandIndex", "int"),
+            ("handLength", "int"),
+            ("drawnCard", "optional card"),
+        ],
+    ),
+    26: (
+        "ServerPlayerMoveOk",
+        [
+            ("player", "str"),
+            ("lastPlayer", "str"),
+            ("card", "card"),
+            ("cardHandIndex", "int"),
+            ("handLength", "int"),
+            ("drawnCard", "optional card"),
+        ],
+    ),
+    27: (
+        "ServerPlayerThunderStrike",
+        [
+            ("player", "str"),
+            ("lastPlayer", "str"),
+            ("card", "card"),
+            ("cardHandIndex", "int"),
+            ("handLength", "int"),
+            ("drawnCard", "optional card"),
+        ],
+    ),
+    28: ("ServerActionInvalid", [("message", "str")]),
+    29: ("ServerInvalidDataReceived", [("data", "str")]),
+    30: ("ServerGameOver", [("score", "int"), ("scoreMessage", "str")]),
+}
+
+
+def _defaults(cls) -> dict:
+    """
+    Returns the attributes that every message of the given type has, whatever its fields
+    (e.g. the sender of the server messages and the action)
+    """
+    params = len(inspect.signature(cls.__init__).parameters) - 1
+    return vars(cls(*[None] * params))
+
+
+# message type -> (tag, [(attribute, encode)])
+_encoders = {}
+# tag -> (message type, defaults, [(attribute, decode)])
+_decoders = {}
+
+
+def register(card_type: type, player_type: type, messages: list) -> None:
+    """
+    Sets the types of the decoded cards and players, and of the messages of SCHEMAS.
+    Raises ValueError if a message of SCHEMAS is missing.
+
+    Args:
+        card_type: the type of the cards, built from (id, value, color)
+        player_type: the type of the players (name, ready and hand)
+        messages: the message types, matched to SCHEMAS by name
+    """
+    global _card_type, _player_type
+    _card_type = card_type
+    _player_type = player_type
+    by_name = {cls.__name__: cls for cls in messages}
+    for tag, (name, schema) in SCHEMAS.items():
+        if name not in by_name:
+            raise ValueError(f"Missing message type {name}")
+        cls = by_name[name]
+        _encoders[cls] = (tag, [(attribute, _FIELDS[field][0]) for attribute, field in schema])
+        _decoders[tag] = (cls, _defaults(cls), [(attribute, _FIELDS[field][1]) for attribute, field in schema])
+
+
+def encode(data: "GameData.GameData") -> bytes:
+    """
+    Returns the payload of the message
+
+    Args:
+        data: the message
+    """
+    try:
+        tag, fields = _encoders[type(data)]
+    except KeyError:
+        raise ValueError(f"Cannot encode {type(data).__name__}")
+    out = bytearray(_HEADER.pack(VERSION, tag))
+    try:
+        for name, encode_field in fields:
+            encode_field(out, getattr(data, name))
+    except (struct.error, KeyError, AttributeError, TypeError) as e:
+        raise ValueError(f"Cannot encode {type(data).__name__}: {e}")
+    return bytes(out)
+
+
+def decode(payload: bytes) -> "GameData.GameData":
+    """
+    Returns the message encoded in the payload.
+    Raises ValueError if the payload is malformed.
+
+    Args:
+        payload: the bytes produced by encode
+    """
+    buf = payload
+    try:
+        version, tag = _HEADER.unpack_from(buf, 0)
+    except struct.error:
+        raise ValueError("Truncated message header")
+    if version != VERSION:
+        raise ValueError(f"Unsupported codec version {version}")
+    if tag not in _decoders:
+        raise ValueError(f"Unknown message tag {tag}")
+    cls, defaults, fields = _decoders[tag]
+    attributes = dict(defaults)
+    offset = _HEADER.size
+    try:
+        for name, decode_field in fields:
+            attributes[name], offset = decode_field(buf, offset)
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ValueError(f"Malformed {cls.__name__}: {e}")
+    if offset != len(buf):
+        raise ValueError(f"Trailing bytes after {cls.__name__}")
+    data = cls.__new__(cls)
+    data.__dict__ = attributes
+    return data
@@ -1,5 +1,10 @@
 # Program constants / server constants
 HOST = "127.0.0.1"
 PORT = 1024  # 0x4A7AB1 could have been a better port, but networkers did not allow us to have it
-DATASIZE = int(10240 / 4)
+DATASIZE = int(10240 / 4)  # size of each socket read
+MAX_DATASIZE = 1 << 20  # maximum size of the payload of a single message
 SEED = None
+MAX_PENDING_MESSAGES = 1024  # messages queued for a client before it's disconnected
+SEND_TIMEOUT = 10  # seconds a client can take to read a write before it's disconnected
+LOG_LEVEL = "INFO"  # minimum level of the log records of the server and of the clients (DEBUG logs every move)
+DECISION_SOCKET = "/tmp/hanabi-decisions.sock"  # Unix socket of the decision service (see decision_service.py)
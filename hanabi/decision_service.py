@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+import numpy as np
+from constants import DECISION_SOCKET, MAX_DATASIZE, SEED
+from game_move import GameMove
+from game_state import GameState
+from hyperparameters import Hyperparameters
+from mcts import MCTS
+from logpipeline import setup_logging
+
+# A local service that runs the searches of many agent clients in a single pool of worker processes,
+# sized to the host instead of to the number of seats. The workers are started (with the search already
+# imported) before the first request, and stay alive across games.
+#
+# The requests and the responses are JSON objects, framed like the game messages (4 bytes, little endian,
+# length of the payload, followed by the payload):
+#
+#   request:  {"state": GameState.to_snapshot(), "player": name, "params": Hyperparameters.to_dict()}
+#   response: {"move": GameMove.to_dict(), "iterations": n, "tree_nodes": n, "tree_bytes": n,
+#              "redeterminizations": n, "reused_determinizations": n, "redeterminization_time": seconds}
+#             or {"error": message}
+#
+# The budget of the search is the one of the hyperparameters (mcts_time_budget and mcts_iterations).
+HEADER_SIZE = 4
+
+log = logging.getLogger("decision-service")
+
+
+def encode_frame(message: Dict) -> bytes:
+    payload = json.dumps(message, separators=(",", ":")).encode("utf-8")
+    if len(payload) > MAX_DATASIZE:
+        raise ValueError(f"Message too big: {len(payload)} bytes")
+    return len(payload).to_bytes(HEADER_SIZE, "little") + payload
+
+
+def _init_worker() -> None:
+    """
+    Initializer of the workers: give every worker its own random streams
+    (they would all inherit the same ones from the service)
+    """
+    if SEED is None:
+        random.seed()
+        np.random.seed()
+
+
+def decide(request: Dict) -> Dict:
+    """
+    Worker function: runs the search for a snapshot and returns the response
+
+    Args:
+        request: the decoded request
+    """
+    try:
+        state = GameState.from_snapshot(request["state"])
+        params = Hyperparameters(**request["params"])
+        search = MCTS(state, request["player"], params)
+        move = search.run_search(
+            time_budget=params.mcts_time_budget,
+            iterations=params.mcts_iterations,
+        )
+        return {
+            "move": move.to_dict(),
+            "iterations": int(search.iterations),
+            "tree_nodes": int(len(search.tree)),
+            "tree_bytes": int(search.tree.nbytes()),
+            "redeterminizations": int(search.redeterminizations),
+            "reused_determinizations": int(search.reused_determinizations),
+            "redeterminization_time": float(search.redeterminization_time),
+        }
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+
+
+class DecisionService:
+    """
+    The server side of the service.
+
+    Attributes:
+        path:       the path of the Unix socket
+        workers:    the number of worker processes
+        pool:       the worker processes
+    """
+
+    def __init__(self, path: str = DECISION_SOCKET, workers: Optional[int] = None) -> None:
+        self.path = path
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.pool = None
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                header = await reader.readexactly(HEADER_SIZE)
+                size = int.from_bytes(header, "little")
+                if size > MAX_DATASIZE:
+                    log.warning("Request too big: %d bytes", size)
+                    break
+                try:
+                    request = json.loads(await reader.readexactly(size))
+                except ValueError as e:
+                    response = {"error": f"Malformed request: {e}"}
+                else:
+                    # the event loop keeps serving the other clients while a worker searches
+                    response = await loop.run_in_executor(self.pool, decide, request)
+                try:
+                    frame = encode_frame(response)
+                except (TypeError, ValueError) as e:
+                    frame = encode_frame({"error": f"Cannot encode the response: {e}"})
+                writer.write(frame)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self) -> None:
+        """
+        Start the workers and serve the clients until cancelled
+        """
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        with ProcessPoolExecutor(self.workers, initializer=_init_worker) as pool:
+            self.pool = pool
+            # start every worker now instead of on the first requests
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*(loop.run_in_executor(pool, os.getpid) for _ in range(self.workers)))
+            server = await asyncio.start_unix_server(self._serve_client, self.path)
+            log.info("Decision service listening on %s with %d workers", self.path, self.workers)
+            try:
+                async with server:
+                    await server.serve_forever()
+            finally:
+                os.unlink(self.path)
+
+
+class DecisionClient:
+    """
+    The client side of the service: a blocking connection used by an agent to run its searches.
+    """
+
+    def __init__(self, path: str = DECISION_SOCKET) -> None:
+        self.path = path
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.connect(path)
+
+    def _receive_exactly(self, size: int) -> bytes:
+        data = bytearray()
+        while len(data) < size:
+            chunk = self._sock.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("Decision service closed the connection")
+            data += chunk
+        return bytes(data)
+
+    def decide(self, state: GameState, player: str, params: Hyperparameters) -> Tuple[GameMove, Dict]:
+        """
+        Returns the move chosen by the search and the statistics of the search
+        (iterations, tree_nodes, tree_bytes, redeterminizations, reused_determinizations and redeterminization_time)
+
+        Args:
+            state: the knowledge of the agent
+            player: the name of the agent
+            params: the hyperparameters of the search
+        """
+        request = {"state": state.to_snapshot(), "player": player, "params": params.to_dict()}
+        self._sock.sendall(encode_frame(request))
+        size = int.from_bytes(self._receive_exactly(HEADER_SIZE), "little")
+        response = json.loads(self._receive_exactly(size))
+        if "error" in response:
+            raise RuntimeError(f"Decision service error: {response['error']}")
+        return GameMove.from_dict(response.pop("move")), response
+
+    def close(self) -> None:
+        self._sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local service running the searches of many agent clients")
+    parser.add_argument("path", nargs="?", default=DECISION_SOCKET, help="path of the Unix socket")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="worker processes (default: one per core)")
+    args = parser.parse_args()
+
+    setup_logging(logging.INFO)
+    try:
+        asyncio.run(DecisionService(args.path, args.workers).serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import copy
+import time
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from game_move import GameMove
+from game_state import GameState, MCTSState
+from hyperparameters import Hyperparameters
+from model import Model
+from rules import Rules
+from tables import HINTS, IDENTITIES
+from utils import Card
+
+
+class _OutOfTime(Exception):
+    pass
+
+
+class EndgameSolver:
+    """
+    Exact expectimax of the last turns of the game, used instead of the MCTS when the deck is nearly empty.
+
+    The move of the agent is the one with the best expected score over every determinization of its hand
+    (weighted by its probability) and every card that can be drawn afterwards. After that move every player,
+    the agent included, makes the first move of the rules, so the expectation is exact for that policy
+    (no player ever uses the identity of its own cards). The states reached along different paths are evaluated once.
+
+    Attributes:
+        game_state: the knowledge of the agent
+        player: the name of the agent
+        params: the hyperparameters of the solver and of the rules
+        states: the number of states evaluated so far
+    """
+
+    def __init__(
+        self,
+        game_state: GameState,
+        player: str,
+        params: Hyperparameters = None,
+    ) -> None:
+        self.game_state = game_state
+        self.player = player
+        self.params = params if params is not None else Hyperparameters()
+        self.states = 0
+        self._values: Dict[tuple, float] = {}
+        self._deadline = None
+
+    @staticmethod
+    def deck_size(game_state: GameState) -> int:
+        """
+        Returns the number of cards left in the deck: the cards the agent hasn't seen, except the ones in its hand
+        """
+        hand = game_state.hands[game_state.root_player]
+        return int(len(game_state.deck)) - sum(1 for card in hand if not card.is_fully_determined())
+
+    def solve(self, deadline: float = None) -> Optional[Tuple[GameMove, float]]:
+        """
+        Returns the best move of the agent with its expected score,
+        or None if the agent's hand has more than endgame_max_determinizations determinizations
+        or the deadline passes before the solution is found
+
+        Args:
+            deadline: the time (as returned by time.time()) at which the solver gives up (None for no limit)
+        """
+        self._deadline = deadline
+        determinizations = self._determinizations()
+        if determinizations is None:
+            return None
+        try:
+            return self._solve(determinizations)
+        except _OutOfTime:
+            return None
+
+    def _solve(self, determinizations: List[Tuple[List[Card], float]]) -> Tuple[GameMove, float]:
+        """
+        Returns the best move of the agent with its expected score (raises _OutOfTime when the deadline passes)
+
+        Args:
+            determinizations: the hands of the agent with their probability
+        """
+        base = MCTSState(self.game_state)
+        # put the determinized cards back in the deck
+        base.deck.add_cards(base.hands[self.player], ignore_fd=True)
+        models = []
+        for hand, probability in determinizations:
+            state = copy.deepcopy(base)
+            state.deck.remove_cards([card for card in hand if not card.is_fully_determined()])
+            state.hands[self.player] = hand
+            models.append((Model(state, self.params), probability))
+
+        best = None
+        for move in self._candidate_moves(base):
+            value = sum(
+                probability * self._move_value(model, move) for model, probability in models
+            )
+            if best is None or value > best[1]:
+                best = (move, value)
+        return best
+
+    def _determinizations(self) -> Optional[List[Tuple[List[Card], float]]]:
+        """
+        Returns every hand of the agent consistent with its knowledge, with its probability
+        (None if there are more than endgame_max_determinizations)
+        """
+        hand = self.game_state.hands[self.player]
+        pool = np.array(self.game_state.deck.get_table(), dtype=np.int64)
+        determinizations = []
+        cards = []
+
+        def assign(idx: int, weight: int) -> bool:
+            if idx == len(hand):
+                determinizations.append((list(cards), weight))
+                return len(determinizations) <= self.params.endgame_max_determinizations
+            card = hand[idx]
+            if card.is_fully_determined():
+                cards.append(card)
+                within_limit = assign(idx + 1, weight)
+                cards.pop()
+                return within_limit
+            ranks = [card.rank - 1] if card.rank_known else range(pool.shape[0])
+            colors = [card.color] if card.color_known else range(pool.shape[1])
+            for r in ranks:
+                for c in colors:
+                    copies = pool[r][c]
+                    if copies == 0:
+                        continue
+                    pool[r][c] -= 1
+                    cards.append(Card(r + 1, c, card.rank_known, card.color_known))
+                    within_limit = assign(idx + 1, weight * copies)
+                    cards.pop()
+                    pool[r][c] += 1
+                    if not within_limit:
+                        return False
+            return True
+
+        if not assign(0, 1):
+            return None
+        total = sum(weight for _, weight in determinizations)
+        return [(hand, weight / total) for hand, weight in determinizations]
+
+    def _candidate_moves(self, state: MCTSState) -> List[GameMove]:
+        """
+        Returns every legal move of the agent (a hint must touch at least one card), one for each effect
+
+        Args:
+            state: a determinization of the game (the moves don't depend on the agent's cards)
+        """
+        moves = []
+        for idx in range(len(state.hands[self.player])):
+            moves.append(GameMove(self.player, "play", card_idx=idx))
+            if state.used_hints() > 0:
+                moves.append(GameMove(self.player, "discard", card_idx=idx))
+        if state.available_hints() > 0:
+            for destination in state.players:
+                if destination == self.player:
+                    continue
+                hand = state.hands[destination]
+                for hint_type, hint_value in HINTS:
+                    attribute = "rank" if hint_type == "value" else "color"
+                    if any(getattr(card, attribute) == hint_value for card in hand):
+                        moves.append(
+                            GameMove(
+                                self.player,
+                                "hint",
+                                destination=destination,
+                                hint_type=hint_type,
+                                hint_value=hint_value,
+                            )
+                        )
+        return Rules.unique_by_effect(state, moves)
+
+    def _move_value(self, model: Model, move: GameMove) -> float:
+        """
+        Returns the expected score of the game after the move, over the cards that can be drawn
+
+        Args:
+            model: the current state (it isn't modified)
+            move: the move to evaluate
+        """
+        next_player = model.state.get_next_player_name(move.player)
+        if move.action_type == "hint" or len(model.state.deck) == 0:
+            child = copy.deepcopy(model)
+            child.make_move(move)
+            return self._value(child, next_player)
+
+        table = model.state.deck.get_table()
+        total = table.sum()
+        value = 0
+        for r, c in zip(*np.nonzero(table)):
+            child = copy.deepcopy(model)
+            child.make_move(move, drawn_card=IDENTITIES[r][c])
+            value += table[r][c] / total * self._value(child, next_player)
+        return value
+
+    def _value(self, model: Model, player: str) -> float:
+        """
+        Returns the expected score of the game when it's the turn of `player` and everyone follows the rules
+
+        Args:
+            model: the current state (it can be modified)
+            player: the name of the player making the next move
+        """
+        ended, score = model.check_ended()
+        if ended:
+            return score
+        state = model.state
+        key = (
+            player,
+            tuple(tuple(card.code for card in state.hands[p]) for p in state.players),
+            state.board.tobytes(),
+            state.hints,
+            state.errors,
+            state.deck.get_table().tobytes(),
+            state.trash.get_table().tobytes(),
+            tuple(state.last_turn_played[p] for p in state.players),
+        )
+        value = self._values.get(key)
+        if value is None:
+            if self._deadline is not None and time.time() > self._deadline:
+                raise _OutOfTime()
+            self.states += 1
+            move = model.valid_moves(player)[0]
+            value = self._move_value(model, move)
+            self._values[key] = value
+        return value
@@ -1,33 +1,27 @@
-from copy import deepcopy
 from random import shuffle, Random
 import GameData
+# the cards and the players travel in the messages: they are defined with them
+from GameData import Card, Player
 import logging
 from constants import SEED
 
 
-class Card(object):
-    def __init__(self, id, value, color) -> None:
-        super().__init__()
-        self.id = id
-        self.value = value
-        self.color = color
-
-    def toString(self):
-        return ("Card " + str(self.id) + "; value: " + str(self.value) + "; color: " + str(self.color))
+COLORS = ("red", "yellow", "green", "blue", "white")
+# number of copies of each value, for each color
+_COPIES = {1: 3, 2: 2, 3: 2, 4: 2, 5: 1}
 
-    def toClientString(self):
-        return ("Card " + str(self.value) + " - " + str(self.color))
 
-    def __repr__(self):
-        return ("Card " + str(self.value) + " - " + str(self.color))
+def _buildCards():
+    cards = []
+    for value, copies in _COPIES.items():
+        for _ in range(copies):
+            for color in COLORS:
+                cards.append(Card(len(cards), value, color))
+    return tuple(cards)
 
-    def __hash__(self):
-        return self.id
 
-    def __eq__(self, other):
-        if not isinstance(other, type(self)):
-            return NotImplemented
-        return self.id == other.id
+# cards are the same for everyone: every game shares this table, in id order, and only moves references around
+CARDS = _buildCards()
 
 
 class Token(object):
@@ -40,35 +34,8 @@ class Token(object):
         return ("Token " + self.type + "; Flipped: " + str(self.flipped))
 
 
-class Player(object):
-    def __init__(self, name) -> None:
-        super().__init__()
-        self.name = name
-        self.ready = False
-        self.hand = []
-
-    def takeCard(self, cards):
-        self.hand.append(cards.pop())
-
-    def toString(self):
-        c = "[ \n\t"
-        for card in self.hand:
-            c += "\t" + card.toString() + " \n\t"
-        c += " ]"
-        return ("Player " + self.name + " { \n\tcards: " + c + "\n}")
-
-    def toClientString(self):
-        c = "[ \n\t"
-        for card in self.hand:
-            c += "\t" + card.toClientString() + " \n\t"
-        c += " ]"
-        return ("Player " + self.name + " { \n\tcards: " + c + "\n}")
-
-
 class Game(object):
 
-    __dataActions = {}
-
     __scoreMessages = [
         "Booooooooooooring!",
         "Meh!",
@@ -77,81 +44,35 @@ class Game(object):
         "AMAZING!",
         "YOU'RE THE BEST!"
     ]
-    __cards = []  # cards are the same for everyone
     __MAX_NOTE_TOKENS = 8
     __MAX_STORM_TOKENS = 3
     __MAX_FIREWORKS = 5
 
     def __init__(self) -> None:
         super().__init__()
+        # Init players
+        self.__players = []
+        self.__playersByName = {}
+        self.__recorder = None
+        self.__resetState()
+        # add actions for each class of data (bound to this game: many games can be played at the same time)
+        self.__dataActions = {}
+        self.__dataActions[GameData.ClientPlayerDiscardCardRequest] = self.__satisfyDiscardRequest
+        self.__dataActions[GameData.ClientGetGameStateRequest] = self.__satisfyShowCardRequest
+        self.__dataActions[GameData.ClientPlayerPlayCardRequest] = self.__satisfyPlayCardRequest
+        self.__dataActions[GameData.ClientHintData] = self.__satisfyHintRequest
+
+    def __resetState(self):
+        '''
+        Bring everything but the players back to the beginning of a game
+        '''
         self.__discardPile = []
-        # Init cards
         self.__gameOver = False
-        if len(self.__cards) == 0:
-            numCards = 0
-            for _ in range(3):
-                self.__cards.append(Card(numCards, 1, "red"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 1, "yellow"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 1, "green"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 1, "blue"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 1, "white"))
-                numCards += 1
-            for _ in range(2):
-                self.__cards.append(Card(numCards, 2, "red"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 2, "yellow"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 2, "green"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 2, "blue"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 2, "white"))
-                numCards += 1
-            for _ in range(2):
-                self.__cards.append(Card(numCards, 3, "red"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 3, "yellow"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 3, "green"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 3, "blue"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 3, "white"))
-                numCards += 1
-            for _ in range(2):
-                self.__cards.append(Card(numCards, 4, "red"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 4, "yellow"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 4, "green"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 4, "blue"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 4, "white"))
-                numCards += 1
-            for _ in range(1):
-                self.__cards.append(Card(numCards, 5, "red"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 5, "yellow"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 5, "green"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 5, "blue"))
-                numCards += 1
-                self.__cards.append(Card(numCards, 5, "white"))
-                numCards += 1
-        self.__cardsToDraw = deepcopy(self.__cards)
-        self.__tableCards = {
-            "red": [],
-            "yellow": [],
-            "green": [],
-            "blue": [],
-            "white": []
-        }
+        # the deck holds references to the shared card table: nothing is copied
+        self.__cardsToDraw = list(CARDS)
+        # card id -> (player, position in the hand) of the cards in the hands
+        self.__cardLocations = {}
+        self.__tableCards = {color: [] for color in COLORS}
 
         ###
         # Init tokens
@@ -159,8 +80,6 @@ class Game(object):
         self.__stormTokens = 0
         ###
 
-        # Init players
-        self.__players = []
         self.__currentPlayer = 0
 
         # init game
@@ -170,11 +89,15 @@ class Game(object):
 
         # score
         self.__score = 0
-        # add actions for each class of data
-        self.__dataActions[GameData.ClientPlayerDiscardCardRequest] = self.__satisfyDiscardRequest
-        self.__dataActions[GameData.ClientGetGameStateRequest] = self.__satisfyShowCardRequest
-        self.__dataActions[GameData.ClientPlayerPlayCardRequest] = self.__satisfyPlayCardRequest
-        self.__dataActions[GameData.ClientHintData] = self.__satisfyHintRequest
+
+    def reset(self, seed=SEED, deck=None):
+        '''
+        Start a new game between the same players, without building a new Game
+        '''
+        self.__resetState()
+        for p in self.__players:
+            p.hand.clear()
+        self.start(seed, deck)
 
     # Request satisfaction methods
     # Each method produces a tuple of ServerToClientData derivates
@@ -189,17 +112,22 @@ class Game(object):
                 if len(self.__cardsToDraw) == 0:
                     self.__lastTurn = True
                     self.__lastMoves -= 1
+            if self.__recorder is not None and result[1] is not None:
+                self.__recorder.record(result[1], self.__noteTokens, self.__stormTokens)
+            wasOver = self.__gameOver
             self.__gameOver, self.__score = self.__checkGameEnded()
             if self.__gameOver:
+                if self.__recorder is not None and not wasOver:
+                    self.__recorder.end(self.__score)
                 logging.info("Game over, people.")
                 logging.info("Please, close the server now")
-                logging.info("Score: " + str(self.__score) + "; message: " +
+                logging.info("Score: %d; message: %s", self.__score,
                              self.__scoreMessages[self.__score // len(self.__scoreMessages)])  # ! BUGFIX index
                 # ! BUGFIX index
                 return (None, GameData.ServerGameOver(self.__score, self.__scoreMessages[self.__score // len(self.__scoreMessages)]))
             return result
         else:
-            return GameData.ServerInvalidDataReceived(data), None
+            return GameData.ServerInvalidDataReceived(data="Unexpected " + type(data).__name__), None
     # Draw request
 
     def __satisfyDiscardRequest(self, data: GameData.ClientPlayerDiscardCardRequest):
@@ -209,23 +137,24 @@ class Game(object):
             if data.handCardOrdered >= len(player.hand) or data.handCardOrdered < 0:
                 return (GameData.ServerActionInvalid("You don't have that many cards!"), None)
             card: Card = player.hand[data.handCardOrdered]
+            handSize = len(player.hand)
             if not self.__discardCard(card.id, player.name):
                 logging.warning(
                     "Impossible discarding a card: there is no used token available")
                 return (GameData.ServerActionInvalid("You have no used tokens"), None)
             else:
                 self.__drawCard(player.name)
-                logging.info("Player: " + self.__getCurrentPlayer().name +
-                             ": card " + str(card.id) + " discarded successfully")
+                drawnCard = self.__lastDrawnCard(player, handSize)
+                logging.debug("Player: %s: card %d discarded successfully", player.name, card.id)
                 self.__nextTurn()
                 # ! ADDED last param. see GameData relative comment in ServerActionValid
-                return (None, GameData.ServerActionValid(self.__getCurrentPlayer().name, player.name, "discard", card, data.handCardOrdered, len(player.hand)))
+                return (None, GameData.ServerActionValid(self.__getCurrentPlayer().name, player.name, "discard", card, data.handCardOrdered, len(player.hand), drawnCard))
         else:
             return (GameData.ServerActionInvalid("It is not your turn yet"), None)
 
     # Show request
     def __satisfyShowCardRequest(self, data: GameData.ClientGetGameStateRequest):
-        logging.info("Showing hand to: " + data.sender)
+        logging.debug("Showing hand to: %s", data.sender)
         currentPlayer, playerList, playerHandSize = self.__getPlayersStatus(data.sender)
         return (GameData.ServerGameStateData(currentPlayer, playerHandSize, playerList, self.__noteTokens, self.__stormTokens, self.__tableCards, self.__discardPile), None)
 
@@ -238,23 +167,24 @@ class Game(object):
             if data.handCardOrdered >= len(p.hand) or data.handCardOrdered < 0:
                 return (GameData.ServerActionInvalid("You don't have that many cards!"), None)
             card: Card = p.hand[data.handCardOrdered]
+            handSize = len(p.hand)
             self.__playCard(p.name, data.handCardOrdered)
+            drawnCard = self.__lastDrawnCard(p, handSize)
             ok = self.__checkTableCards()
             if not ok:
                 self.__nextTurn()
                 # ! ADDED last param. see GameData relative comment of GameData.ServerPlayerThunderStrike
-                return (None, GameData.ServerPlayerThunderStrike(self.__getCurrentPlayer().name, p.name, card, data.handCardOrdered, len(p.hand)))
+                return (None, GameData.ServerPlayerThunderStrike(self.__getCurrentPlayer().name, p.name, card, data.handCardOrdered, len(p.hand), drawnCard))
             else:
-                logging.info(self.__getCurrentPlayer().name +
-                             ": card played and correctly put on the table")
+                logging.debug("%s: card played and correctly put on the table", p.name)
                 if card.value == 5:
-                    logging.info(card.color + " pile has been filled.")
+                    logging.debug("%s pile has been filled.", card.color)
                     if self.__noteTokens > 0:
                         self.__noteTokens -= 1
-                        logging.info("Giving 1 free note token.")
+                        logging.debug("Giving 1 free note token.")
                 self.__nextTurn()
                 # ! ADDED last param. see GameData relative comment of GameData.ServerPlayerMoveOk
-                return (None, GameData.ServerPlayerMoveOk(self.__getCurrentPlayer().name, p.name, card, data.handCardOrdered, len(p.hand)))
+                return (None, GameData.ServerPlayerMoveOk(self.__getCurrentPlayer().name, p.name, card, data.handCardOrdered, len(p.hand), drawnCard))
         else:
             return (GameData.ServerActionInvalid("It is not your turn yet"), None)
 
@@ -269,11 +199,7 @@ class Game(object):
                 "All the note tokens have been used. Impossible getting hints")
             return GameData.ServerActionInvalid("All the note tokens have been used"), None
         positions = []
-        destPlayer: Player = None
-        for p in self.__players:
-            if p.name == data.destination:
-                destPlayer = p
-                break
+        destPlayer: Player = self.__getPlayer(data.destination)
         if destPlayer is None:
             return GameData.ServerInvalidDataReceived(data="The selected player does not exist"), None
 
@@ -296,8 +222,8 @@ class Game(object):
             return GameData.ServerInvalidDataReceived(data="You cannot give hints about cards that the other person does not have"), None
         self.__nextTurn()
         self.__noteTokens += 1
-        logging.info("Player " + data.sender + " providing hint to " + data.destination +
-                     ": cards with " + data.type + " " + str(data.value) + " are in positions: " + str(positions))
+        logging.debug("Player %s providing hint to %s: cards with %s %s are in positions: %s",
+                      data.sender, data.destination, data.type, data.value, positions)
         # ! ADDED last param. see GameData relative comment
         return None, GameData.ServerHintData(data.sender, data.destination, data.type, data.value, positions, self.__getCurrentPlayer().name)
 
@@ -307,19 +233,21 @@ class Game(object):
     # Player functions
     # players list. Not the best, but there are literally max 5 players and the list should give us the order of connection = the order of the rounds
     def addPlayer(self, name: str):
-        self.__players.append(Player(name))
+        player = Player(name)
+        self.__players.append(player)
+        self.__playersByName.setdefault(name, player)
 
     def removePlayer(self, name: str):
-        for p in self.__players:
-            if p.name == name:
-                self.__players.remove(p)
-                break
+        p = self.__playersByName.pop(name, None)
+        if p is not None:
+            self.__players.remove(p)
+            for card in p.hand:
+                del self.__cardLocations[card.id]
 
     def setPlayerReady(self, name: str):
-        for p in self.__players:
-            if p.name == name:
-                p.ready = True
-                break
+        p = self.__playersByName.get(name)
+        if p is not None:
+            p.ready = True
 
     def getNumReadyPlayers(self) -> int:
         count = 0
@@ -332,24 +260,38 @@ class Game(object):
         self.__currentPlayer += 1
         self.__currentPlayer %= len(self.__players)
 
-    def start(self):
+    def setRecorder(self, recorder):
+        '''
+        Record the next games with a gamelog.GameRecorder (None to stop recording)
+        '''
+        self.__recorder = recorder
+
+    def start(self, seed=SEED, deck=None):
+        '''
+        Shuffle the deck and deal the cards.
+        deck: the ids of the cards of the deck, in order (the last one is drawn first), instead of shuffling it.
+        '''
         self.__lastMoves = len(self.__players) + 1
-        Random(SEED).shuffle(self.__cardsToDraw)
+        if deck is not None:
+            self.__cardsToDraw = [CARDS[id] for id in deck]
+        else:
+            Random(seed).shuffle(self.__cardsToDraw)
         if len(self.__players) < 2:
             logging.warning("Not enough players!")
             return
-        for card in self.__cardsToDraw:
-            print(card.toString())
+        if self.__recorder is not None:
+            self.__recorder.begin(seed, [card.id for card in self.__cardsToDraw], [p.name for p in self.__players])
+        logging.debug("Deck: %s", self.__cardsToDraw)
         logging.info("Ok, let's start the game!")
         if len(self.__players) < 4:
             for p in self.__players:
                 for _ in range(5):
-                    p.takeCard(self.__cardsToDraw)
+                    self.__giveCard(p)
         else:
             for _ in range(4):
                 for p in self.__players:
-                    p.takeCard(self.__cardsToDraw)
-        print(len(self.__cardsToDraw))
+                    self.__giveCard(p)
+        logging.debug("Cards left in the deck: %d", len(self.__cardsToDraw))
         self.__started = True
 
     def __getPlayersStatus(self, currentPlayerName):
@@ -367,9 +309,7 @@ class Game(object):
         return (self.__players[self.__currentPlayer].name, players, handSize)
 
     def __getPlayer(self, currentPlayerName: str) -> Player:
-        for p in self.__players:
-            if p.name == currentPlayerName:
-                return p
+        return self.__playersByName.get(currentPlayerName)
 
     def __getCurrentPlayer(self) -> Player:
         return self.__players[self.__currentPlayer]
@@ -378,37 +318,48 @@ class Game(object):
         if self.__noteTokens < 1:  # Ok only if you already used at least 1 token
             return False
         self.__noteTokens -= 1
-        endLoop = False
-        # find player
-        for p in self.__players:
-            if endLoop:
-                break
-            if p.name == playerName:
-                # find card
-                for card in p.hand:
-                    if endLoop:
-                        break
-                    if card.id == cardID:
-                        self.__discardPile.append(card)  # discard
-                        p.hand.remove(card)  # remove from hand
-                        endLoop = True
+        p, position = self.__cardLocations[cardID]
+        if p.name == playerName:
+            self.__discardPile.append(self.__takeFromHand(p, position))  # discard
         return True
 
     def __drawCard(self, playerName: str):
         if len(self.__cardsToDraw) == 0:
             return
-        card = self.__cardsToDraw.pop()
-        for p in self.__players:
-            if p.name == playerName:
-                p.hand.append(card)
+        self.__giveCard(self.__getPlayer(playerName))
 
     def __playCard(self, playerName: str, cardPosition: int):
         p = self.__getPlayer(playerName)
-        self.__tableCards[p.hand[cardPosition].color].append(
-            p.hand[cardPosition])
-        p.hand.pop(cardPosition)
+        card = self.__takeFromHand(p, cardPosition)
+        self.__tableCards[card.color].append(card)
         if len(self.__cardsToDraw) > 0:
-            p.hand.append(self.__cardsToDraw.pop())
+            self.__giveCard(p)
+
+    def __giveCard(self, p: Player):
+        '''
+        Move the top card of the deck to the right of the hand of the player
+        '''
+        card = self.__cardsToDraw.pop()
+        self.__cardLocations[card.id] = (p, len(p.hand))
+        p.hand.append(card)
+
+    def __lastDrawnCard(self, p: Player, handSize: int) -> Card:
+        '''
+        The card drawn by the player after playing or discarding, None if the deck was empty
+        '''
+        if len(p.hand) == handSize:
+            return p.hand[-1]
+        return None
+
+    def __takeFromHand(self, p: Player, position: int) -> Card:
+        '''
+        Remove a card from the hand of the player: the cards on its right shift left
+        '''
+        card = p.hand.pop(position)
+        del self.__cardLocations[card.id]
+        for i in range(position, len(p.hand)):
+            self.__cardLocations[p.hand[i].id] = (p, i)
+        return card
 
     def __checkTableCards(self) -> bool:
         for cardPool in self.__tableCards:
@@ -448,3 +399,9 @@ class Game(object):
 
     def getScore(self):
         return self.__score
+
+    def getStormTokens(self):
+        return self.__stormTokens
+
+    def getDeckSize(self):
+        return len(self.__cardsToDraw)
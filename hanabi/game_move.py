@@ -54,3 +54,17 @@ class GameMove:
         result.hint_type = self.hint_type
         result.hint_value = self.hint_value
         return result
+
+    def to_dict(self) -> dict:
+        return {
+            "player": self.player,
+            "action_type": self.action_type,
+            "card_idx": None if self.card_idx is None else int(self.card_idx),
+            "destination": self.destination,
+            "hint_type": self.hint_type,
+            "hint_value": None if self.hint_value is None else int(self.hint_value),
+        }
+
+    @staticmethod
+    def from_dict(move: dict) -> "GameMove":
+        return GameMove(**move)
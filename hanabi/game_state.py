@@ -5,13 +5,13 @@ import GameData
 from hyperparameters import SCORE_3_ERRORS
 
 from utils import (
-    CARD_QUANTITIES,
     color_str2enum,
     Color,
     Card,
     Deck,
     Trash,
 )
+from tables import FULL_TABLE, HAND_SIZES, HINT_OUTCOMES
 
 MAX_HINTS = 8
 MAX_ERRORS = 3
@@ -52,9 +52,7 @@ class GameState:
             root_player: the name of the root player (agent)
             data: the server game state to use to initialize the client game state
         """
-        global HAND_SIZE
-        if len(players_names) >= 4:
-            HAND_SIZE = 4
+        hand_size = HAND_SIZES.get(len(players_names), HAND_SIZE)
         self.players = copy.deepcopy(players_names)
         self.root_player = root_player
         if data is not None:
@@ -67,7 +65,7 @@ class GameState:
                 player.name: GameState.server_to_client_hand(player.hand)
                 for player in data.players
             }
-            self.hands[root_player] = [Card(None, None) for _ in range(HAND_SIZE)]
+            self.hands[root_player] = [Card(None, None) for _ in range(hand_size)]
             for player, hand in self.hands.items():
                 if player != self.root_player:
                     self.deck.remove_cards(hand)
@@ -78,7 +76,7 @@ class GameState:
         result = cls.__new__(cls)
         result.players = copy.deepcopy(self.players)
         result.root_player = copy.copy(self.root_player)
-        result.hands = copy.deepcopy(self.hands)
+        result.hands = {player: list(hand) for player, hand in self.hands.items()}
         result.board = np.copy(self.board)
         result.trash = copy.deepcopy(self.trash)
         result.deck = copy.deepcopy(self.deck)
@@ -87,6 +85,43 @@ class GameState:
         result.last_turn_played = copy.deepcopy(self.last_turn_played)
         return result
 
+    def to_snapshot(self) -> dict:
+        """
+        Returns the state as a dictionary of plain lists and numbers (JSON friendly), cards as their codes
+        """
+        self.deck.assert_no_reserved_cards()
+        return {
+            "players": list(self.players),
+            "root_player": self.root_player,
+            "hands": {player: [card.code for card in hand] for player, hand in self.hands.items()},
+            "board": self.board.tolist(),
+            "trash": [card.code for card in self.trash.list],
+            "deck": self.deck.get_table().tolist(),
+            "hints": self.hints,
+            "errors": self.errors,
+        }
+
+    @staticmethod
+    def from_snapshot(snapshot: dict) -> "GameState":
+        """
+        Rebuilds a state from the dictionary returned by to_snapshot
+
+        Args:
+            snapshot: the dictionary returned by to_snapshot
+        """
+        state = GameState(snapshot["players"], snapshot["root_player"])
+        state.hands = {
+            player: [Card.from_code(code) for code in hand] for player, hand in snapshot["hands"].items()
+        }
+        state.board = np.array(snapshot["board"], dtype=np.uint8)
+        state.trash = Trash()
+        for code in snapshot["trash"]:
+            state.trash.append(Card.from_code(code))
+        state.deck = Deck.from_table(snapshot["deck"])
+        state.hints = snapshot["hints"]
+        state.errors = snapshot["errors"]
+        return state
+
     @staticmethod
     def server_to_client_hand(server_hand: list) -> List[Card]:
         """
@@ -131,10 +166,11 @@ class GameState:
         """
         Let the root player discover a card in his own hand
         """
-        card = self.hands[self.root_player][card_idx]
+        hand = self.hands[self.root_player]
+        card = hand[card_idx]
         if not card.is_fully_determined():
-            card.reveal_rank(rank)
-            card.reveal_color(color)
+            card = card.reveal_rank(rank).reveal_color(color)
+            hand[card_idx] = card
             self.deck.remove_cards([card])
 
     def card_discarded(self, player: str, card_idx: int) -> None:
@@ -196,9 +232,10 @@ class GameState:
             if card.is_fully_determined():
                 continue
             if hint_type == "value":
-                card.reveal_rank(hint_value)
+                card = card.reveal_rank(hint_value)
             elif hint_type == "color":
-                card.reveal_color(hint_value)
+                card = card.reveal_color(hint_value)
+            hand[idx] = card
             # the root player fully determined a card and now knows it's not in the deck
             if destination == self.root_player and card.is_fully_determined():
                 self.deck.remove_cards([card])
@@ -216,7 +253,7 @@ class MCTSState(GameState):
             copy.deepcopy(initial_state.players),
             copy.copy(initial_state.root_player),
         )
-        self.hands = copy.deepcopy(initial_state.hands)
+        self.hands = {player: list(hand) for player, hand in initial_state.hands.items()}
         self.board = np.copy(initial_state.board)
         self.deck = copy.deepcopy(initial_state.deck)
         self.trash = copy.deepcopy(initial_state.trash)
@@ -236,7 +273,7 @@ class MCTSState(GameState):
         self.assert_consistency()
 
     # MCTS
-    def play_card(self, player: str, card_idx: int) -> None:
+    def play_card(self, player: str, card_idx: int, drawn_card: Card = None) -> None:
         """
         Track a card played by "player". The played card will be removed from the player's hand
         and added to either the board or the trash depending on its value
@@ -246,11 +283,11 @@ class MCTSState(GameState):
         Args:
             player: the name of the player
             card_idx: the index of the card in the player's hand
+            drawn_card: the card drawn from the deck (None to draw a random one)
         """
         card = self.hands[player].pop(card_idx)
         if len(self.deck) > 0:
-            self.deck.assert_no_reserved_cards()
-            self.hands[player].append(self.deck.draw())
+            self._draw(player, drawn_card)
         if self.board[card.color] == card.rank - 1:
             self.board[card.color] += 1
             if card.rank == 5 and self.hints > 0:
@@ -259,7 +296,7 @@ class MCTSState(GameState):
             self.trash.append(card)
             self.errors += 1
 
-    def discard_card(self, player: str, card_idx: int) -> None:
+    def discard_card(self, player: str, card_idx: int, drawn_card: Card = None) -> None:
         """
         Track a card discarded by "player". The discarded card will be removed from the player's hand
         and added to the trash (the number of tokens will be adjusted accordingly)
@@ -268,16 +305,31 @@ class MCTSState(GameState):
         Args:
             player: the name of the player
             card_idx: the index of the card in the player's hand
+            drawn_card: the card drawn from the deck (None to draw a random one)
         """
         # if self.hints == 0:
         #     raise RuntimeError("No used hint tokens")
         card = self.hands[player].pop(card_idx)
         self.trash.append(card)
         if len(self.deck) > 0:
-            self.deck.assert_no_reserved_cards()
-            self.hands[player].append(self.deck.draw())
+            self._draw(player, drawn_card)
         self.hints = max(self.hints - 1, 0)
 
+    def _draw(self, player: str, card: Card = None) -> None:
+        """
+        Move a card from the deck to the last position of the player's hand
+
+        Args:
+            player: the name of the player
+            card: the card to draw (None to draw a random one)
+        """
+        self.deck.assert_no_reserved_cards()
+        if card is None:
+            card = self.deck.draw()
+        else:
+            self.deck.remove_cards([card])
+        self.hands[player].append(card)
+
     def give_hint(self, destination: str, hint_type: str, hint_value: int) -> None:
         """
         This works asssuming that all the cards in all the players' hands have a defined rank and color
@@ -285,12 +337,10 @@ class MCTSState(GameState):
         """
         # if self.hints == MAX_HINTS:
         #     raise RuntimeError("Maximum number of hints already reached")
+        outcomes = HINT_OUTCOMES[(hint_type, hint_value)]
         hand = self.hands[destination]
-        for card in hand:
-            if hint_type == "value" and card.rank == hint_value:
-                card.reveal_rank()
-            elif hint_type == "color" and card.color == hint_value:
-                card.reveal_color()
+        for idx, card in enumerate(hand):
+            hand[idx] = outcomes[card.code]
         self.hints = min(self.hints + 1, MAX_HINTS)
 
     # MCTS
@@ -344,6 +394,37 @@ class MCTSState(GameState):
             self.deck.assert_no_reserved_cards()
             self.hands[player_name] = new_hand
 
+    def swap_hand(self, player_name: str, hand: List[Card]) -> bool:
+        """
+        Replace the player's hand with another determinization of it, if it is consistent with the player's
+        knowledge (same knowledge in every slot, cards still in the deck). Returns False otherwise.
+
+        Args:
+            player_name: the name of the player
+            hand: the new determinization of the hand
+        """
+        current = self.hands[player_name]
+        if len(hand) != len(current):
+            return False
+        for old, new in zip(current, hand):
+            if old.rank_known != new.rank_known or old.color_known != new.color_known:
+                return False
+            if (old.rank_known and old.rank != new.rank) or (old.color_known and old.color != new.color):
+                return False
+        pool = self.deck.get_table().copy()
+        for card in current:
+            if not card.is_fully_determined():
+                pool[card.rank - 1][card.color] += 1
+        for card in hand:
+            if not card.is_fully_determined():
+                pool[card.rank - 1][card.color] -= 1
+        if np.any(pool < 0):
+            return False
+        self.deck.add_cards(current, ignore_fd=True)
+        self.deck.remove_cards([card for card in hand if not card.is_fully_determined()])
+        self.hands[player_name] = list(hand)
+        return True
+
     # MCTS
     def restore_hand(self, player_name: str, saved_hand: List[Card]) -> None:
         """
@@ -385,13 +466,10 @@ class MCTSState(GameState):
         the board + the cards from the hands + the cards remaining in the deck should always be equal to the cards from
         a full deck)s
         """
-        col = np.array(CARD_QUANTITIES)
-        col = col.reshape(col.size, 1)
-        full_table = np.tile(col, len(Color))
         table = np.copy(self.deck[slice(5), slice(5)])
 
         # trash
-        trash_table = full_table - self.trash.get_table()
+        trash_table = FULL_TABLE - self.trash.get_table()
         table += trash_table
 
         # hands
@@ -404,15 +482,20 @@ class MCTSState(GameState):
             for i in range(tos):
                 table[i][c_idx] += 1
 
-        assert np.all(table == full_table), "Consistency failed"
+        assert np.all(table == FULL_TABLE), "Consistency failed"
 
-    def game_ended(self) -> Tuple[bool, Optional[float]]:
+    def game_ended(
+        self, score_3_errors: float = SCORE_3_ERRORS
+    ) -> Tuple[bool, Optional[float]]:
         """
         Checks if the game is ended for some reason. If it's ended, it returns True and the score of the game.
         If the game isn't ended, it returns False, None
+
+        Args:
+            score_3_errors: the fraction of the board score obtained if the game ended with 3 errors
         """
         if self.errors == MAX_ERRORS:
-            return True, sum(self.board) * SCORE_3_ERRORS
+            return True, sum(self.board) * score_3_errors
         # if self.board == self.trash.maxima:
         if np.all(self.board == 5):
             return True, sum(self.board)
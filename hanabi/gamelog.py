@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+import mmap
+import os
+import struct
+from typing import Iterator, List, Optional, Tuple
+import GameData
+from game import COLORS
+
+# A game log file is a sequence of games. Each game is a header, followed by one fixed-size record
+# for every move and by an end record with the final score:
+#
+#   header: magic, version, number of seats, number of records, seed (-1 if random)
+#           the ids of the cards of the deck, in order (the last one is drawn first)
+#           the names of the seats, in turn order (length + utf-8)
+#   record: seat, action, target, value, card, outcome, used note tokens, used storm tokens
+#
+# Since the header stores the number of records, the games can be skipped without reading the moves.
+MAGIC = b"HNBL"
+VERSION = 1
+DECK_SIZE = 50
+BUFFER_SIZE = 1 << 16
+
+_HEADER = struct.Struct("<4sBBHq")
+_RECORD = struct.Struct("<8B")
+
+# actions
+HINT_COLOR = 0
+HINT_VALUE = 1
+PLAY = 2
+DISCARD = 3
+END = 255
+
+NO_CARD = 255
+NO_SEED = -1
+
+
+class Move:
+    """
+    A move of a recorded game.
+
+    Attributes:
+        seat:           the index of the player in turn order
+        action:         HINT_COLOR, HINT_VALUE, PLAY or DISCARD
+        target:         the index of the card in the hand (play and discard) or the seat of the destination (hints)
+        value:          the color index or the rank of a hint
+        card:           the id of the played or discarded card (NO_CARD for hints)
+        outcome:        1 if a card was played correctly, 0 for a strike; the positions touched by a hint as a bitmask
+        note_tokens:    the used note tokens after the move
+        storm_tokens:   the used storm tokens after the move
+    """
+
+    __slots__ = (
+        "seat",
+        "action",
+        "target",
+        "value",
+        "card",
+        "outcome",
+        "note_tokens",
+        "storm_tokens",
+    )
+
+    def __init__(self, *fields: int) -> None:
+        (
+            self.seat,
+            self.action,
+            self.target,
+            self.value,
+            self.card,
+            self.outcome,
+            self.note_tokens,
+            self.storm_tokens,
+        ) = fields
+
+    def to_request(self, seats: List[str]) -> GameData.ClientToServerData:
+        """
+        Returns the request that the player sent to the server to make this move
+
+        Args:
+            seats: the names of the players in turn order
+        """
+        sender = seats[self.seat]
+        if self.action == HINT_COLOR:
+            return GameData.ClientHintData(sender, seats[self.target], "color", COLORS[self.value])
+        if self.action == HINT_VALUE:
+            return GameData.ClientHintData(sender, seats[self.target], "value", self.value)
+        if self.action == PLAY:
+            return GameData.ClientPlayerPlayCardRequest(sender, self.target)
+        if self.action == DISCARD:
+            return GameData.ClientPlayerDiscardCardRequest(sender, self.target)
+        raise ValueError(f"Unknown action {self.action}")
+
+    def __repr__(self):
+        return f"Move ({', '.join(f'{name}={getattr(self, name)}' for name in self.__slots__)})"
+
+
+def encode_game(seed: Optional[int], deck: List[int], seats: List[str], records: bytes, score: int) -> bytes:
+    """
+    Returns the bytes of a whole game
+
+    Args:
+        seed: the seed used to shuffle the deck (None if random)
+        deck: the ids of the cards of the deck, in order
+        seats: the names of the players in turn order
+        records: the packed move records
+        score: the final score
+    """
+    header = bytearray(
+        _HEADER.pack(
+            MAGIC,
+            VERSION,
+            len(seats),
+            len(records) // _RECORD.size + 1,
+            NO_SEED if seed is None else seed,
+        )
+    )
+    header += bytes(deck)
+    for name in seats:
+        data = name.encode("utf-8")
+        header.append(len(data))
+        header += data
+    return bytes(header) + records + _RECORD.pack(0, END, 0, score, NO_CARD, 0, 0, 0)
+
+
+class GameLogWriter:
+    """
+    Appends games to a log file, through a large write buffer.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._file = open(path, "ab", buffering=BUFFER_SIZE)
+
+    def write(self, game: bytes) -> None:
+        self._file.write(game)
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class GameRecorder:
+    """
+    Records the games of a game.Game (see Game.setRecorder): the moves are accumulated in memory
+    and the whole game is handed to the writer when it's over.
+
+    Attributes:
+        data:   the bytes of the last finished game
+    """
+
+    def __init__(self, writer: Optional[GameLogWriter] = None) -> None:
+        self.writer = writer
+        self.data = None
+        self._seats = None
+
+    def begin(self, seed: Optional[int], deck: List[int], seats: List[str]) -> None:
+        self._seed = seed
+        self._deck = deck
+        self._seats = {name: seat for seat, name in enumerate(seats)}
+        self._names = list(seats)
+        self._records = bytearray()
+
+    def record(self, data: GameData.ServerToClientData, note_tokens: int, storm_tokens: int) -> None:
+        """
+        Record the outcome of a move
+
+        Args:
+            data: the message broadcast by the server after the move
+            note_tokens: the used note tokens after the move
+            storm_tokens: the used storm tokens after the move
+        """
+        if self._seats is None:
+            return
+        if type(data) is GameData.ServerHintData:
+            if data.type == "value":
+                action, value = HINT_VALUE, data.value
+            else:
+                action, value = HINT_COLOR, COLORS.index(data.value)
+            touched = 0
+            for position in data.positions:
+                touched |= 1 << position
+            fields = (self._seats[data.source], action, self._seats[data.destination], value, NO_CARD, touched)
+        elif type(data) is GameData.ServerActionValid:
+            fields = (self._seats[data.lastPlayer], DISCARD, data.cardHandIndex, 0, data.card.id, 0)
+        elif type(data) in (GameData.ServerPlayerMoveOk, GameData.ServerPlayerThunderStrike):
+            correctly = type(data) is GameData.ServerPlayerMoveOk
+            fields = (self._seats[data.lastPlayer], PLAY, data.cardHandIndex, 0, data.card.id, int(correctly))
+        else:
+            return
+        self._records += _RECORD.pack(*fields, note_tokens, storm_tokens)
+
+    def end(self, score: int) -> None:
+        if self._seats is None:
+            return
+        self.data = encode_game(self._seed, self._deck, self._names, bytes(self._records), score)
+        if self.writer is not None:
+            self.writer.write(self.data)
+        self._seats = None
+
+
+class GameRecord:
+    """
+    A game of a log file. The moves are decoded only when requested.
+
+    Attributes:
+        seed:       the seed used to shuffle the deck (None if random)
+        deck:       the ids of the cards of the deck, in order
+        seats:      the names of the players in turn order
+        score:      the final score
+    """
+
+    def __init__(self, buffer, offset: int) -> None:
+        magic, version, players, records, seed = _HEADER.unpack_from(buffer, offset)
+        if magic != MAGIC:
+            raise ValueError(f"Not a game log record at offset {offset}")
+        if version != VERSION:
+            raise ValueError(f"Unsupported game log version {version}")
+        offset += _HEADER.size
+        self.seed = None if seed == NO_SEED else seed
+        self.deck = tuple(buffer[offset:offset + DECK_SIZE])
+        offset += DECK_SIZE
+        self.seats = []
+        for _ in range(players):
+            size = buffer[offset]
+            self.seats.append(bytes(buffer[offset + 1:offset + 1 + size]).decode("utf-8"))
+            offset += 1 + size
+        self._buffer = buffer
+        self._records_offset = offset
+        self._num_moves = records - 1
+        end_record = _RECORD.unpack_from(buffer, offset + (records - 1) * _RECORD.size)
+        if end_record[1] != END:
+            raise ValueError("Missing end record")
+        self.score = end_record[3]
+
+    def __len__(self) -> int:
+        return self._num_moves
+
+    def moves(self) -> Iterator[Move]:
+        end = self._records_offset + self._num_moves * _RECORD.size
+        view = memoryview(self._buffer)[self._records_offset:end]
+        return (Move(*fields) for fields in _RECORD.iter_unpack(view))
+
+    def move(self, turn: int) -> Move:
+        if turn < 0 or turn >= self._num_moves:
+            raise IndexError(turn)
+        return Move(*_RECORD.unpack_from(self._buffer, self._records_offset + turn * _RECORD.size))
+
+    def state_at(self, turn: int, player: str):
+        """
+        Returns the GameState of a player at the beginning of a turn, rebuilt by replaying the recorded moves
+        (the agents only track them, they don't search)
+
+        Args:
+            turn: the number of moves already played (0 <= turn < len(self))
+            player: the name of the player
+        """
+        from selfplay import SelfPlayGame
+
+        if turn < 0 or turn >= self._num_moves:
+            raise IndexError(turn)
+        game = SelfPlayGame(len(self.seats), names=self.seats, deck=list(self.deck))
+        for move in self.moves():
+            if turn == 0:
+                break
+            game.apply(move.to_request(self.seats))
+            turn -= 1
+        return game.agents[player]._game_state
+
+
+class GameLogReader:
+    """
+    Memory-maps a game log file: the games are indexed by skipping from header to header.
+    An empty file (e.g. the log of a server before its first game ends) has no games.
+    """
+
+    def __init__(self, path: str) -> None:
+        self._file = open(path, "rb")
+        self._map = None
+        self._offsets = []
+        if os.fstat(self._file.fileno()).st_size == 0:
+            return  # an empty file cannot be mapped
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        offset = 0
+        while offset < len(self._map):
+            if offset + _HEADER.size > len(self._map):
+                self.close()
+                raise ValueError(f"Truncated game log record at offset {offset}")
+            magic, version, players, records, _ = _HEADER.unpack_from(self._map, offset)
+            if magic != MAGIC:
+                self.close()
+                raise ValueError(f"Not a game log record at offset {offset}")
+            if version != VERSION:
+                self.close()
+                raise ValueError(f"Unsupported game log version {version}")
+            self._offsets.append(offset)
+            offset += _HEADER.size + DECK_SIZE
+            for _ in range(players):
+                offset += 1 + self._map[offset]
+            offset += records * _RECORD.size
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __getitem__(self, index: int) -> GameRecord:
+        return GameRecord(self._map, self._offsets[index])
+
+    def __iter__(self) -> Iterator[GameRecord]:
+        return (GameRecord(self._map, offset) for offset in self._offsets)
+
+    def close(self) -> None:
+        if self._map is not None:
+            self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def summary(path: str) -> Tuple[int, float]:
+    """
+    Returns the number of games of a log file and their average score
+    """
+    with GameLogReader(path) as reader:
+        scores = [game.score for game in reader]
+    return len(scores), sum(scores) / len(scores) if scores else 0.0
+
+
+if __name__ == "__main__":
+    from sys import argv
+
+    if len(argv) < 2:
+        print(f"Usage: {argv[0]} <game log>")
+        exit(-1)
+    games, score = summary(argv[1])
+    print(f"{games} games, average score {score:.2f}")
@@ -9,3 +9,151 @@ PLAY_SAFE_PROBABILITY = 0.7  #
 PLAY_SAFE_LATE_PROBABILITY = 0.4  #
 DISCARD_PROBABILITY = 0.7  #
 EXPEND_PROBABILITY = 0.7  #
+UCB_C = 0.1  #
+TREE_MAX_NODES = None  # NB: None means that the tree is unbounded
+TREE_PRUNE: bool = False  # NB: if TREE_PRUNE is False, a full tree stops expanding instead of reclaiming nodes
+PUCT_C = None  # NB: None means UCB1 selection and uniformly random expansion, without priors
+RULE_PRIOR_DECAY = 0.8
+RULE_PRIOR_MIN_CONFIDENCE = 0.1
+UNPRUNING_WIDTH = 2
+UNPRUNING_GROWTH = 2.0
+DEDUP_MOVES: bool = False  # NB: if DEDUP_MOVES is False, the tree can hold many moves with the same effect
+RAVE_K = None  # NB: None means that the AMAF statistics are neither collected nor used
+ROLLOUT_BATCH = None  # NB: None means that every expanded node gets MCTS_SIMULATIONS rollouts
+ROLLOUT_CI_WIDTH = 2.0
+REDETERMINIZATION = "always"  # NB: one among "always", "changed" and "every_k"
+REDETERMINIZATION_K = 2
+# NB: sequential halving doesn't reach the decisions of UCB1 with fewer iterations: on 40 positions it agreed with
+# a 300-iteration UCB1 search on 33/40 at both 8 and 15 iterations, against 35/40 and 37/40 for UCB1
+SEQUENTIAL_HALVING: bool = False  # NB: if SEQUENTIAL_HALVING is False, the moves of the root are selected like the others
+ENDGAME_DECK_SIZE = None  # NB: None means that the search is never replaced by the endgame solver
+ENDGAME_MAX_DETERMINIZATIONS = 100
+
+
+class Hyperparameters:
+    """
+    A configuration of the agent. Every attribute defaults to the module constant with the same (uppercase) name,
+    so that different configurations can be used in the same process.
+
+    Attributes:
+        mcts_iterations:            the maximum number of iterations of each search
+        mcts_time_budget:           the maximum amount of time (in seconds) of each search
+        mcts_simulations:           the number of rollouts performed from each expanded node
+        score_3_errors:             the fraction of the board score obtained when the game ends with 3 errors
+        rule_9_min_hints:           the minimum number of used hints for rule 9 to discard without information
+        rule_9_best_idx_0:          whether rule 9 discards the oldest card instead of the first unknown rank
+        rule_8_deck_length:         the deck length under which rule 8 is enabled
+        play_safe_probability:      the threshold of rule 7
+        play_safe_late_probability: the threshold of rule 8
+        discard_probability:        the threshold of rule 9
+        expend_probability:         the threshold of rule 10
+        ucb_c:                      the exploration coefficient of UCB1
+        tree_max_nodes:             the maximum number of nodes of the search tree (None for no limit)
+        tree_prune:                 whether a full tree reclaims its least visited subtrees or stops expanding
+        puct_c:                     the exploration coefficient of the prior-weighted (PUCT) selection
+                                    (None to select with UCB1 and expand without priors)
+        rule_prior_decay:           the weight of each rule's move relative to the previous rule's, in the priors
+        rule_prior_min_confidence:  the minimum weight of a play or discard, whatever the probability of its card
+        unpruning_width:            the number of moves (by decreasing prior) open at a node with no visits
+        unpruning_growth:           the factor by which the visits of a node grow before the next move is opened
+        dedup_moves:                whether the moves of the rules with the same effect are merged into one
+        rave_k:                     the visits of a node at which its AMAF value weighs half in UCB1 (RAVE)
+                                    (None to not use the AMAF statistics)
+        rollout_batch:              the rollouts made from every expanded node before checking their variance
+                                    (None to always make mcts_simulations rollouts)
+        rollout_ci_width:           the half width (in points) of the 95% confidence interval of the rollouts' mean
+                                    at which no more rollouts are made (at most mcts_simulations)
+        redeterminization:          when the hand of the player moving is re-determinized during the selection:
+                                    "always", "changed" (only when the determinization it had when it last moved
+                                    no longer fits its knowledge) or "every_k" (every redeterminization_k levels,
+                                    and when it no longer fits)
+        redeterminization_k:        the levels between two re-determinizations with the "every_k" policy
+        sequential_halving:         whether the budget is spent on the moves of the root by sequential halving
+        endgame_deck_size:          the number of cards left in the deck at which the endgame solver replaces the search
+                                    (None to always search)
+        endgame_max_determinizations: the maximum number of determinizations of the agent's hand in the endgame solver
+                                    (the search is used when there are more)
+    """
+
+    def __init__(
+        self,
+        mcts_iterations: int = MCTS_ITERATIONS,
+        mcts_time_budget: float = MCTS_TIME_BUDGET,
+        mcts_simulations: int = MCTS_SIMULATIONS,
+        score_3_errors: float = SCORE_3_ERRORS,
+        rule_9_min_hints: int = RULE_9_MIN_HINTS,
+        rule_9_best_idx_0: bool = RULE_9_BEST_IDX_0,
+        rule_8_deck_length: int = RULE_8_DECK_LENGTH,
+        play_safe_probability: float = PLAY_SAFE_PROBABILITY,
+        play_safe_late_probability: float = PLAY_SAFE_LATE_PROBABILITY,
+        discard_probability: float = DISCARD_PROBABILITY,
+        expend_probability: float = EXPEND_PROBABILITY,
+        ucb_c: float = UCB_C,
+        tree_max_nodes: int = TREE_MAX_NODES,
+        tree_prune: bool = TREE_PRUNE,
+        puct_c: float = PUCT_C,
+        rule_prior_decay: float = RULE_PRIOR_DECAY,
+        rule_prior_min_confidence: float = RULE_PRIOR_MIN_CONFIDENCE,
+        unpruning_width: int = UNPRUNING_WIDTH,
+        unpruning_growth: float = UNPRUNING_GROWTH,
+        dedup_moves: bool = DEDUP_MOVES,
+        rave_k: float = RAVE_K,
+        rollout_batch: int = ROLLOUT_BATCH,
+        rollout_ci_width: float = ROLLOUT_CI_WIDTH,
+        redeterminization: str = REDETERMINIZATION,
+        redeterminization_k: int = REDETERMINIZATION_K,
+        sequential_halving: bool = SEQUENTIAL_HALVING,
+        endgame_deck_size: int = ENDGAME_DECK_SIZE,
+        endgame_max_determinizations: int = ENDGAME_MAX_DETERMINIZATIONS,
+    ) -> None:
+        self.mcts_iterations = mcts_iterations
+        self.mcts_time_budget = mcts_time_budget
+        self.mcts_simulations = mcts_simulations
+        self.score_3_errors = score_3_errors
+        self.rule_9_min_hints = rule_9_min_hints
+        self.rule_9_best_idx_0 = rule_9_best_idx_0
+        self.rule_8_deck_length = rule_8_deck_length
+        self.play_safe_probability = play_safe_probability
+        self.play_safe_late_probability = play_safe_late_probability
+        self.discard_probability = discard_probability
+        self.expend_probability = expend_probability
+        self.ucb_c = ucb_c
+        self.tree_max_nodes = tree_max_nodes
+        self.tree_prune = tree_prune
+        self.puct_c = puct_c
+        self.rule_prior_decay = rule_prior_decay
+        self.rule_prior_min_confidence = rule_prior_min_confidence
+        self.unpruning_width = unpruning_width
+        self.unpruning_growth = unpruning_growth
+        self.dedup_moves = dedup_moves
+        self.rave_k = rave_k
+        self.rollout_batch = rollout_batch
+        self.rollout_ci_width = rollout_ci_width
+        self.redeterminization = redeterminization
+        self.redeterminization_k = redeterminization_k
+        self.sequential_halving = sequential_halving
+        self.endgame_deck_size = endgame_deck_size
+        self.endgame_max_determinizations = endgame_max_determinizations
+
+    def __eq__(self, other):
+        if type(other) is not Hyperparameters:
+            return NotImplemented
+        return vars(self) == vars(other)
+
+    def __repr__(self):
+        params = ", ".join(f"{k}={v}" for k, v in vars(self).items())
+        return f"Hyperparameters ({params})"
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+    def replace(self, **changes) -> "Hyperparameters":
+        """
+        Returns a copy of this configuration with some attributes changed
+        """
+        params = self.to_dict()
+        for name in changes:
+            if name not in params:
+                raise AttributeError(f"Unknown hyperparameter: {name}")
+        params.update(changes)
+        return Hyperparameters(**params)
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+from typing import List, Optional, TextIO
+
+# Asynchronous logging: the threads that log only put the records on a queue, and a background thread
+# formats them and writes them in batches, flushing the outputs once per batch. A record below the level
+# of the logger is dropped before its message is formatted, so the messages must use lazy %-style arguments
+# (logger.info("Player %s", name)) rather than building the string in advance.
+FORMAT = "%(asctime)s %(levelname)s: %(message)s"
+DATE_FORMAT = "%m/%d/%Y %I:%M:%S %p"
+BATCH_SIZE = 256
+
+_writer = None
+_handler = None
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """
+    Puts the records on the queue as they are: the message is formatted by the writer thread,
+    not by the thread that logs it (the queue never leaves the process, so nothing needs to be pickled).
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class LogWriter(threading.Thread):
+    """
+    The background thread that writes the queued records.
+
+    Attributes:
+        queue:      the queue filled by the logging calls
+        streams:    the outputs of the records
+        formatter:  the formatter of the records
+    """
+
+    def __init__(self, record_queue: queue.SimpleQueue, streams: List[TextIO], formatter: logging.Formatter) -> None:
+        super().__init__(name="log-writer", daemon=True)
+        self.queue = record_queue
+        self.streams = streams
+        self.formatter = formatter
+
+    def run(self) -> None:
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            # everything logged in the meantime goes in the same write
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                batch = batch[:batch.index(None)]
+                running = False
+            self._write(batch)
+
+    def _write(self, records: List[logging.LogRecord]) -> None:
+        lines = []
+        for record in records:
+            try:
+                lines.append(self.formatter.format(record) + "\n")
+            except Exception:
+                lines.append(f"Cannot format log record {record.msg!r} {record.args!r}\n")
+        text = "".join(lines)
+        for stream in self.streams:
+            try:
+                stream.write(text)
+                stream.flush()
+            except (OSError, ValueError):
+                pass
+
+    def stop(self) -> None:
+        """
+        Write the records still in the queue and stop the thread
+        """
+        self.queue.put(None)
+        self.join()
+
+
+def setup_logging(
+    level: int = logging.INFO,
+    filename: Optional[str] = None,
+    stdout: bool = True,
+    fmt: str = FORMAT,
+) -> LogWriter:
+    """
+    Route the records of every logger through the background writer.
+    Calling it again replaces the previous writer.
+
+    Args:
+        level: the minimum level of the records that are written
+        filename: the file where the records are appended (None to not write them to a file)
+        stdout: whether the records are written to the standard output
+        fmt: the format of the records
+    """
+    global _writer, _handler
+    stop_logging()
+    streams = []
+    if filename is not None:
+        streams.append(open(filename, "a", encoding="utf-8"))
+    if stdout:
+        streams.append(sys.stdout)
+    record_queue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    _handler = _QueueHandler(record_queue)
+    root.addHandler(_handler)
+    root.setLevel(level)
+    _writer = LogWriter(record_queue, streams, logging.Formatter(fmt, DATE_FORMAT))
+    _writer.start()
+    return _writer
+
+
+def stop_logging() -> None:
+    """
+    Write the pending records and stop the background writer
+    """
+    global _writer, _handler
+    if _writer is None:
+        return
+    logging.getLogger().removeHandler(_handler)
+    _writer.stop()
+    for stream in _writer.streams:
+        if stream is not sys.stdout:
+            stream.close()
+    _writer = None
+    _handler = None
+
+
+# the writer is a daemon thread: write what's left when the interpreter exits
+atexit.register(stop_logging)
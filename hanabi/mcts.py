@@ -7,7 +7,7 @@ from tree import Tree, Node, GameNode
 from functools import reduce
 import numpy as np
 import random
-from hyperparameters import MCTS_SIMULATIONS
+from hyperparameters import Hyperparameters
 
 DEBUG = False
 
@@ -22,6 +22,15 @@ def find(pred, iterable):
     return None
 
 
+def _move_key(move: GameMove) -> tuple:
+    """
+    Returns a hashable key of the move, equal for equal moves.
+    """
+    if move.action_type == "hint":
+        return (move.player, move.action_type, move.destination, move.hint_type, move.hint_value)
+    return (move.player, move.action_type, move.card_idx)
+
+
 class MCTS:
     """
     Wrapper class for the Monte Carlo Tree Search.
@@ -29,14 +38,32 @@ class MCTS:
     Attributes:
         game_state: the GameState object corresponding to the current state of the "actual" game
         tree: the tree structure used for the search
+        iterations: the number of search iterations performed so far
+        rollouts: the number of rollouts performed so far
+        redeterminizations: the number of hands re-determinized during the selection so far
+        reused_determinizations: the number of hands that kept their previous determinization instead
+        redeterminization_time: the time (in seconds) spent restoring and re-determinizing hands so far
+        params: the hyperparameters of the search
     """
-    def __init__(self, game_state: GameState, current_player: str) -> None:
+    def __init__(
+        self,
+        game_state: GameState,
+        current_player: str,
+        params: Hyperparameters = None,
+    ) -> None:
         self.game_state = game_state
+        self.params = params if params is not None else Hyperparameters()
+        self.iterations = 0
+        self.rollouts = 0
+        self.redeterminizations = 0
+        self.reused_determinizations = 0
+        self.redeterminization_time = 0
+        self._determinizations = {}
         prev_player = game_state.get_prev_player_name(current_player)
         root = Node(
             GameNode(GameMove(prev_player, action_type=None))
         )  # dummy game-move
-        self.tree = Tree(root)
+        self.tree = Tree(root, self.params.tree_max_nodes, self.params.tree_prune)
 
     def run_search(self, time_budget: int = None, iterations: int = None) -> GameMove:
         """
@@ -51,6 +78,9 @@ class MCTS:
                 "At least one between iterations and time_budget must be specified"
             )
 
+        if self.params.sequential_halving:
+            return self._run_sequential_halving(time_budget, iterations)
+
         # each iteration represents the select, expand, simulate, backpropagate iteration
 
         if time_budget is not None and iterations is not None:
@@ -79,21 +109,83 @@ class MCTS:
         )
         return best_move_node.data.move
 
-    def _run_search_iteration(self) -> None:
+    def _run_sequential_halving(self, time_budget: int = None, iterations: int = None) -> GameMove:
+        """
+        Runs the search with sequential halving at the root: every move of the root is expanded, the budget
+        is split evenly across ceil(log2(moves)) rounds, and each round is split evenly across the moves still
+        in play (below them the tree policy is used as usual). After each round, the worse half of the moves
+        (by mean value) is dropped.
+
+        Args:
+            time_budget: the maximum amount of time for the whole search
+            iterations: the maximum number of iterations of the whole search
+        """
+        root = self.tree.get_root()
+        model = Model(MCTSState(self.game_state), self.params)
+        moves = self._get_available_plays(root, model)
+        for move in moves:
+            if not self.tree.make_room(root):
+                break
+            self.tree.insert(Node(GameNode(move)), root)
+        arms = self.tree.get_children(root)
+        if len(arms) == 0:
+            # no move of the root fits in the tree: the first move of the rules
+            return moves[0]
+
+        rounds = int(np.ceil(np.log2(len(arms))))
+        start_time = time.time()
+        for round_idx in range(rounds):
+            deadline = None
+            if time_budget is not None:
+                deadline = start_time + time_budget * (round_idx + 1) / rounds
+            # every move still in play gets at least one iteration per round
+            round_iterations = len(arms)
+            if iterations is not None:
+                round_iterations = max(round_iterations, iterations // rounds)
+            n_iterations = 0
+            while (deadline is not None and time.time() < deadline) or n_iterations < round_iterations:
+                self._run_search_iteration(arms[n_iterations % len(arms)])
+                n_iterations += 1
+            arms = sorted(arms, key=self._mean_value, reverse=True)[: (len(arms) + 1) // 2]
+        return max(arms, key=self._mean_value).data.move
+
+    @staticmethod
+    def _mean_value(node: Node) -> float:
+        return node.data.value / node.data.simulations if node.data.simulations > 0 else 0
+
+    def _run_search_iteration(self, root_child: Node = None) -> None:
         """
         Performs a single iteration of the run_search.
+
+        Args:
+            root_child: the child of the root the iteration must go through (None to select it with the tree policy)
         """
-        select_leaf, select_model = self._select(Model(MCTSState(self.game_state)))
+        self.iterations += 1
+        model = Model(MCTSState(self.game_state), self.params)
+        if self.params.redeterminization != "always":
+            # the determinizations are kept from one iteration to the next, while they fit
+            model.determinizations = self._determinizations
+        if self.params.rave_k is not None:
+            # trace the moves of the iteration, from the root to the end of each rollout
+            model.trace = []
+        select_leaf, select_model = self._select(model, root_child)
 
         # print('selected node ', select_leaf)
         expand_leaf, expand_model = self._expand(select_leaf, select_model)
 
         ## added
-        simulation_score = 0
-        for _ in range(MCTS_SIMULATIONS):
-            simulation_score += self._simulate(expand_leaf, copy.deepcopy(expand_model))
-        simulation_score /= MCTS_SIMULATIONS
-        self._backpropagate(expand_leaf, simulation_score)
+        scores = []
+        rollouts = []
+        while not self._enough_rollouts(scores):
+            rollout_model = copy.deepcopy(expand_model)
+            score = self._simulate(expand_leaf, rollout_model)
+            scores.append(score)
+            if rollout_model.trace is not None:
+                rollouts.append((rollout_model.trace, score))
+        expand_leaf.data.rollouts += len(scores)
+        self.rollouts += len(scores)
+        simulation_score = sum(scores) / len(scores)
+        self._backpropagate(expand_leaf, simulation_score, rollouts)
         if DEBUG:
             print(
                 "children list of ",
@@ -113,30 +205,78 @@ class MCTS:
                 )
             input("Enter...")
 
-    def _select(self, model: Model) -> Tuple[Node, Model]:
+    def _enough_rollouts(self, scores: List[float]) -> bool:
+        """
+        Returns True if no more rollouts are needed from the expanded node: mcts_simulations were made or,
+        with adaptive rollouts, the 95% confidence interval of their mean is within rollout_ci_width points.
+
+        Args:
+            scores: the scores of the rollouts made so far
+        """
+        if len(scores) >= self.params.mcts_simulations:
+            return True
+        if self.params.rollout_batch is None or len(scores) < max(2, self.params.rollout_batch):
+            return False
+        half_width = 1.96 * np.std(scores, ddof=1) / np.sqrt(len(scores))
+        return half_width <= self.params.rollout_ci_width
+
+    def _select(self, model: Model, root_child: Node = None) -> Tuple[Node, Model]:
         """
         Performs the select phase of the MCTS.
 
         Args:
             model: the class Model object
+            root_child: the child of the root to descend to first (None to select it with the tree policy)
         """
         node = self.tree.get_root()
         # model.state.redeterminize_hand(model.state.root_player)
         next_player = model.state.get_next_player_name(node.data.move.player)
-        while not node.is_leaf() and self._is_fully_explored(node, model):
-            node = self._get_best_child_UCB1(node)
+        depth = 0
+        while root_child is not None or (not node.is_leaf() and self._is_fully_explored(node, model)):
+            if root_child is not None:
+                node, root_child = root_child, None
+            elif self.params.puct_c is None:
+                node = self._get_best_child_UCB1(node)
+            else:
+                node = self._get_best_child_PUCT(node)
             # make the move that bring us to "node"
             model.make_move(node.data.move, update_saved_hand=True)
             assert next_player == node.data.move.player
+            start_time = time.perf_counter()
             model.restore_hand(node.data.move.player)  # restore hand
             next_player = model.state.get_next_player_name(node.data.move.player)
-            model.redeterminize_hand(next_player)  # re-determinize hand
+            depth += 1
+            if not self._must_redeterminize(depth) and model.reuse_determinization(next_player):
+                self.reused_determinizations += 1
+            elif next_player != model.state.root_player:
+                model.redeterminize_hand(next_player)  # re-determinize hand
+                self.redeterminizations += 1
+            self.redeterminization_time += time.perf_counter() - start_time
         return node, model
 
+    def _must_redeterminize(self, depth: int) -> bool:
+        """
+        Returns True if the hand of the player moving at this depth of the selection must be re-determinized,
+        False if the determinization it had when it last moved can be kept (when still consistent with its knowledge)
+
+        Args:
+            depth: the depth of the node being left
+        """
+        policy = self.params.redeterminization
+        if policy == "always":
+            return True
+        if policy == "changed":
+            return False
+        if policy == "every_k":
+            return depth % self.params.redeterminization_k == 0
+        raise ValueError(f"Unknown re-determinization policy: {policy}")
+
     def _is_fully_explored(self, node: Node, model: Model) -> bool:
         """
         return True if there is no more moves playable at a certain level that has not been tried yet
         """
+        if self.params.puct_c is not None:
+            return len(self._get_available_prioritized_plays(node, model)) == 0
         return len(self._get_available_plays(node, model)) == 0
 
     def _get_available_plays(self, node: Node, model: Model) -> List[GameMove]:
@@ -157,6 +297,28 @@ class MCTS:
             )
         )
 
+    def _get_available_prioritized_plays(self, node: Node, model: Model) -> List[Tuple[GameMove, float]]:
+        """
+        Returns the moves not tried yet from a certain node with their priors, most likely first.
+        Progressive unpruning: only the unpruning_width most likely moves are open at first, and one more
+        opens every time the visits of the node grow by a factor unpruning_growth.
+
+        Args:
+            node: the current node
+            model: the object of class model
+        """
+        children = self.tree.get_children(node)
+        player = model.state.get_next_player_name(node.data.move.player)
+        moves = model.valid_moves_with_priors(player)
+        opened = self.params.unpruning_width
+        if node.data.simulations > 1:
+            opened += int(np.log(node.data.simulations) / np.log(self.params.unpruning_growth))
+        return [
+            (move, prior)
+            for move, prior in moves[:opened]
+            if not find(lambda child: child.data.move == move, children)
+        ]
+
     def _expand(self, node: Node, model: Model) -> Tuple[Node, Model]:
         """
         Performs the expand phase of the MCTS.
@@ -168,11 +330,20 @@ class MCTS:
         expanded_node = None
 
         # model.check_win should check if the match is over, not if it is won (see simulation and backpropagation function)
-        if not model.check_ended()[0]:
-            legal_moves = self._get_available_plays(node, model)
-            random_move = random.choice(legal_moves)
-            model.make_move(random_move)
-            expanded_node = Node(GameNode(random_move))
+        if not self.tree.make_room(node):
+            # the tree reached its maximum size: simulate from the selected node without expanding it
+            expanded_node = node
+        elif not model.check_ended()[0]:
+            if self.params.puct_c is None:
+                legal_moves = self._get_available_plays(node, model)
+                random_move = random.choice(legal_moves)
+                model.make_move(random_move)
+                expanded_node = Node(GameNode(random_move))
+            else:
+                # the most likely move not tried yet
+                best_move, prior = self._get_available_prioritized_plays(node, model)[0]
+                model.make_move(best_move)
+                expanded_node = Node(GameNode(best_move, prior))
             self.tree.insert(expanded_node, node)
         else:
             expanded_node = node
@@ -208,14 +379,17 @@ class MCTS:
         return score
 
     # def backpropagate(self, node, winner: int):
-    def _backpropagate(self, node: Node, score: int) -> None:
+    def _backpropagate(self, node: Node, score: int, rollouts: List[Tuple[List[GameMove], int]] = ()) -> None:
         """
         Performs the backpropagate phase of the MCTS.
 
         Args:
             node: the 'youngest' node of the explored tree (the one returned from the expand phase)
             score: the score of the simulated game
+            rollouts: the moves made from the root in each rollout, with its score (only with RAVE)
         """
+        if rollouts:
+            self._update_amaf(node, rollouts)
         # as the simulation function, this one needs to be changed
         # here nodes value is incremented if it leads to a winning game for the agent
         # but in our case need to be evaluated in proportion to the score
@@ -227,16 +401,47 @@ class MCTS:
             node = self.tree.get_parent(node)
         node.data.simulations += 1
 
-    def _UCB1(self, node: Node, parent: Node, c: float = 0.1) -> float:
+    def _update_amaf(self, node: Node, rollouts: List[Tuple[List[GameMove], int]]) -> None:
+        """
+        Updates the AMAF statistics along the path of the iteration: a child of a node on the path
+        takes the score of a rollout if its player made its move at any point after that node.
+
+        Args:
+            node: the 'youngest' node of the explored tree
+            rollouts: the moves made from the root in each rollout, with its score
+        """
+        path = [node]
+        while not path[-1].is_root():
+            path.append(self.tree.get_parent(path[-1]))
+        path.reverse()
+        for moves, score in rollouts:
+            # the first time each move was made (the i-th move is the one made at depth i + 1)
+            first_made = {}
+            for i, move in enumerate(moves):
+                first_made.setdefault(_move_key(move), i)
+            for depth, parent in enumerate(path):
+                for child in self.tree.get_children(parent):
+                    if first_made.get(_move_key(child.data.move), -1) >= depth:
+                        child.data.amaf_simulations += 1
+                        child.data.amaf_value += score / 25
+
+    def _UCB1(self, node: Node, parent: Node, c: float = None) -> float:
         """
         Calculates the Upper Confidence Bound for the MCTS.
 
         Args:
             node: the node for which it calculates the UCB
             parent: the parent node of `node`
-            c: the coefficient of the formula
+            c: the coefficient of the formula (None to use the one of the hyperparameters)
         """
+        if c is None:
+            c = self.params.ucb_c
         exploitation = node.data.value / node.data.simulations
+        if self.params.rave_k is not None and node.data.amaf_simulations > 0:
+            # RAVE: trust the AMAF value while the node has few visits of its own
+            beta = np.sqrt(self.params.rave_k / (3 * node.data.simulations + self.params.rave_k))
+            amaf = node.data.amaf_value / node.data.amaf_simulations
+            exploitation = (1 - beta) * exploitation + beta * amaf
         if parent.data.simulations == 0:
             exploration = 0
         else:
@@ -245,6 +450,31 @@ class MCTS:
             )
         return exploitation + c * exploration
 
+    def _PUCT(self, node: Node, parent: Node, c: float = None) -> float:
+        """
+        Calculates the prior-weighted upper confidence bound (PUCT) of a node: the exploration term
+        favours the moves that the rules consider more likely.
+
+        Args:
+            node: the node for which it calculates the bound
+            parent: the parent node of `node`
+            c: the coefficient of the formula (None to use the one of the hyperparameters)
+        """
+        if c is None:
+            c = self.params.puct_c
+        exploitation = node.data.value / node.data.simulations if node.data.simulations > 0 else 0
+        exploration = node.data.prior * np.sqrt(parent.data.simulations) / (1 + node.data.simulations)
+        return exploitation + c * exploration
+
+    def _get_best_child_PUCT(self, node: Node) -> Node:
+        """
+        Returns the best child of node, based on the PUCT calculations.
+
+        Args:
+             node: the node whose children are being evaluated
+        """
+        return max(self.tree.get_children(node), key=lambda child: self._PUCT(child, node))
+
     def _get_best_child_UCB1(self, node: Node) -> Node:
         """
         Returns the best child of node, based on the UCB calculations.
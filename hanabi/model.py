@@ -4,21 +4,32 @@ import random
 from typing import Tuple, List
 from game_state import MCTSState
 from game_move import GameMove
-from utils import Color, CARD_QUANTITIES
+from utils import Card, Color, CARD_QUANTITIES
 from rules import Rules
+from hyperparameters import Hyperparameters
 
 
 class Model:
-    def __init__(self, mcts_state: MCTSState) -> None:
+    def __init__(self, mcts_state: MCTSState, params: Hyperparameters = None) -> None:
         self.state = mcts_state
+        self.params = params if params is not None else Hyperparameters()
         self._saved_hand = None
+        # the hand each player had when it last moved, determinized from its point of view
+        self.determinizations = {}
+        # the moves made so far, when they are traced (None otherwise)
+        self.trace = None
         self.state.assert_consistency()
 
     def __deepcopy__(self, memo={}):
         cls = self.__class__
         result = cls.__new__(cls)
         result.state = copy.deepcopy(self.state)
-        result._saved_hand = copy.deepcopy(self._saved_hand)
+        result.params = self.params
+        result._saved_hand = (
+            list(self._saved_hand) if self._saved_hand is not None else None
+        )
+        result.determinizations = dict(self.determinizations)
+        result.trace = list(self.trace) if self.trace is not None else None
         return result
 
     def redeterminize_hand(self, player: str) -> None:
@@ -31,10 +42,31 @@ class Model:
         if self._saved_hand is not None:
             raise RuntimeError("Trying to overwrite saved hand")
         if player != self.state.root_player:
-            self._saved_hand = copy.deepcopy(self.state.hands[player])
+            self._saved_hand = list(self.state.hands[player])
             self.state.redeterminize_hand(player)
         self.state.assert_consistency()
 
+    def reuse_determinization(self, player: str) -> bool:
+        """
+        Save the player's hand and replace it with the one it had, from its point of view, when it last moved.
+        Returns False (and changes nothing) if there is no such hand or it is no longer consistent
+        with what the player knows, or if the player is the root player.
+
+        Args:
+            player: the name of the player
+        """
+        if self._saved_hand is not None:
+            raise RuntimeError("Trying to overwrite saved hand")
+        determinization = self.determinizations.get(player)
+        if player == self.state.root_player or determinization is None:
+            return False
+        hand = list(self.state.hands[player])
+        if not self.state.swap_hand(player, determinization):
+            return False
+        self._saved_hand = hand
+        self.state.assert_consistency()
+        return True
+
     def restore_hand(self, player: str) -> None:
         """
         Restore the player's hand with the previous saved one
@@ -45,6 +77,7 @@ class Model:
         if player != self.state.root_player:
             if self._saved_hand is None:
                 raise RuntimeError("No saved hand")
+            self.determinizations[player] = list(self.state.hands[player])
             self.state.restore_hand(player, self._saved_hand)
             self._saved_hand = None
         self.state.assert_consistency()
@@ -111,14 +144,19 @@ class Model:
         return moves
 
     def valid_moves(self, this_player: str) -> List[GameMove]:
-        return Rules.get_rules_moves(self.state, this_player)
+        return Rules.get_rules_moves(self.state, this_player, self.params)
+
+    def valid_moves_with_priors(self, this_player: str) -> List[Tuple[GameMove, float]]:
+        return Rules.get_rules_moves_with_priors(self.state, this_player, self.params)
 
-    def make_move(self, move: GameMove, update_saved_hand: bool = False) -> None:
+    def make_move(self, move: GameMove, update_saved_hand: bool = False, drawn_card: Card = None) -> None:
         """
         Makes a move and updates the game state accordingly
 
         Args:
             move: the move to perform
+            update_saved_hand: whether the card played or discarded is also removed from the saved hand
+            drawn_card: the card drawn after a play or a discard (None to draw a random one)
         """
         if self.state.last_turn_played[move.player]:
             raise RuntimeError(f"{move.player} already performed the last turn play")
@@ -132,10 +170,10 @@ class Model:
             if update_saved_hand and self._saved_hand is not None:
                 del self._saved_hand[move.card_idx]
             if move.action_type == "play":
-                self.state.play_card(move.player, move.card_idx)
+                self.state.play_card(move.player, move.card_idx, drawn_card)
             elif move.action_type == "discard":
                 # assert self.state.used_hints() > 0
-                self.state.discard_card(move.player, move.card_idx)
+                self.state.discard_card(move.player, move.card_idx, drawn_card)
             else:
                 raise RuntimeError(f"Unknown action type: {move.action_type}")
 
@@ -144,6 +182,9 @@ class Model:
         if is_last_move:
             self.state.last_turn_played[move.player] = True
 
+        if self.trace is not None:
+            self.trace.append(move)
+
     # the name should be changed to something like make_intentional_move, because it shouldn't be random
     def make_random_move(self, player: str) -> bool:
         """
@@ -226,4 +267,4 @@ class Model:
         """
         Returns True and the score of the game, if the game is ended. Returns False, None otherwise.
         """
-        return self.state.game_ended()
+        return self.state.game_ended(self.params.score_3_errors)
@@ -1,18 +1,11 @@
-from typing import List, Callable, Optional
+from typing import List, Callable, Optional, Tuple
 import copy
 from game_state import MCTSState
 from game_move import GameMove
 from utils import Card, Color, CARD_QUANTITIES, Deck, Trash
+from tables import IDENTITIES, HINT_OUTCOMES
 import numpy as np
-from hyperparameters import (
-    PLAY_SAFE_PROBABILITY,
-    PLAY_SAFE_LATE_PROBABILITY,
-    DISCARD_PROBABILITY,
-    RULE_9_MIN_HINTS,
-    RULE_9_BEST_IDX_0,
-    EXPEND_PROBABILITY,
-    RULE_8_DECK_LENGTH,
-)
+from hyperparameters import Hyperparameters
 
 
 class Rules:
@@ -23,51 +16,158 @@ class Rules:
     _state: MCTSState = None
     _player: str = None
     _mental_state: Deck = None
+    _params: Hyperparameters = Hyperparameters()
+    # how likely the move returned by the last rule is to be right (the probability computed for its card)
+    _confidence: float = 1.0
 
     @staticmethod
-    def get_rules_moves(state: MCTSState, player: str) -> List[GameMove]:
+    def get_rules_moves(
+        state: MCTSState, player: str, params: Hyperparameters = None
+    ) -> List[GameMove]:
         """
-        The only method exposed. Returns a list of 'smart' moves based on the rules coded in this class.
+        The main method exposed. Returns a list of 'smart' moves based on the rules coded in this class.
 
         Args:
              state: the current game state
              player: the player of the current node
+             params: the hyperparameters of the rules (None for the default ones)
+        """
+        moves = [move for move, _ in Rules._apply_rules(state, player, params)]
+        if Rules._params.dedup_moves:
+            moves = Rules.unique_by_effect(state, moves)
+        return moves
+
+    @staticmethod
+    def get_rules_moves_with_priors(
+        state: MCTSState, player: str, params: Hyperparameters = None
+    ) -> List[Tuple[GameMove, float]]:
+        """
+        Returns the distinct 'smart' moves with their prior probabilities (summing to 1), most likely first.
+        Each rule weighs rule_prior_decay times the previous one, and is further weighted by the probability
+        computed for the card it plays or discards. A move suggested by many rules (or, with dedup_moves,
+        a move with the same effect) gets the sum of their weights.
+
+        Args:
+             state: the current game state
+             player: the player of the current node
+             params: the hyperparameters of the rules (None for the default ones)
+        """
+        params = params if params is not None else Hyperparameters()
+        moves = []
+        effects = []
+        priors = []
+        weight = 1.0
+        for move, confidence in Rules._apply_rules(state, player, params, keep_empty=True):
+            if move is not None:
+                prior = weight * max(confidence, params.rule_prior_min_confidence)
+                effect = Rules._effect(state, move) if params.dedup_moves else None
+                for idx, other in enumerate(moves):
+                    if other == move or (effect is not None and effects[idx] == effect):
+                        priors[idx] += prior
+                        break
+                else:
+                    moves.append(move)
+                    effects.append(effect)
+                    priors.append(prior)
+            weight *= params.rule_prior_decay
+        total = sum(priors)
+        ranked = sorted(range(len(moves)), key=lambda idx: -priors[idx])
+        return [(moves[idx], priors[idx] / total) for idx in ranked]
+
+    @staticmethod
+    def _effect(state: MCTSState, move: GameMove) -> tuple:
+        """
+        Returns the effect of a move on the game state: moves with the same effect are interchangeable.
+        A hint is identified by the knowledge of the hand it leaves (every hint that reveals nothing
+        has the same effect), a play or a discard by the identity of its card when the player knows it
+        (by its slot otherwise).
+
+        Args:
+            state: the current game state
+            move: the move being evaluated
+        """
+        if move.action_type == "hint":
+            outcomes = HINT_OUTCOMES[(move.hint_type, move.hint_value)]
+            hand = state.hands[move.destination]
+            revealed = tuple(outcomes[card.code].code for card in hand)
+            if revealed == tuple(card.code for card in hand):
+                return ("hint",)
+            return ("hint", move.destination, revealed)
+        card = state.hands[move.player][move.card_idx]
+        if card.is_fully_determined():
+            return (move.action_type, card.rank, card.color)
+        return (move.action_type, move.card_idx)
+
+    @staticmethod
+    def unique_by_effect(state: MCTSState, moves: List[GameMove]) -> List[GameMove]:
+        """
+        Returns the first move of each group of moves with the same effect, in order
+
+        Args:
+            state: the current game state
+            moves: the moves being deduplicated
+        """
+        unique = {}
+        for move in moves:
+            unique.setdefault(Rules._effect(state, move), move)
+        return list(unique.values())
+
+    @staticmethod
+    def _apply_rules(
+        state: MCTSState, player: str, params: Hyperparameters = None, keep_empty: bool = False
+    ) -> List[Tuple[Optional[GameMove], float]]:
+        """
+        Returns the move of each rule, in order, with the confidence of the rule in it
+
+        Args:
+             state: the current game state
+             player: the player of the current node
+             params: the hyperparameters of the rules (None for the default ones)
+             keep_empty: whether the rules that don't suggest any move are returned (with a None move)
         """
 
         Rules._state = state
         Rules._player = player
+        Rules._params = params if params is not None else Hyperparameters()
         Rules._mental_state = copy.deepcopy(state.deck)
         Rules._mental_state.add_cards(state.hands[player], ignore_fd=False)
 
+        rules = [
+            # RULE 1
+            Rules._tell_most_information,
+            # RULE 2
+            lambda: Rules._tell_anyone(Rules._is_playable),
+            # RULE 3
+            lambda: Rules._tell_anyone(Rules._is_discardable),
+            # RULE 3b
+            lambda: Rules._tell_anyone(Rules._is_risky),
+            # RULE 4
+            lambda: Rules._complete_tell_anyone(Rules._is_playable),
+            # RULE 5
+            lambda: Rules._complete_tell_anyone(Rules._is_discardable),
+            # RULE 6
+            lambda: Rules._complete_tell_anyone(Rules._is_unplayable),
+            # RULE 7
+            # # probability p ∈ [0.4, 0.8]
+            # highest = 0.8
+            # lowest = 0.4
+            # # p = highest + len(deck)*(lowest-highest)/50  NB: 50 is the max length of deck
+            # p = highest + len(state.deck)*(lowest-highest/50)
+            lambda: Rules._play_probably_safe(Rules._params.play_safe_probability),
+            # RULE 8
+            lambda: Rules._play_probably_safe_late(Rules._params.play_safe_late_probability),
+            # RULE 9
+            lambda: Rules._discard_probably_useless(Rules._params.discard_probability),
+            # RULE 10
+            # lambda: Rules._discard_least_likely_to_be_necessary(Rules._params.expend_probability),
+        ]
         moves = []
-        # RULE 1
-        moves.append(Rules._tell_most_information())
-        # RULE 2
-        moves.append(Rules._tell_anyone(Rules._is_playable))
-        # RULE 3
-        moves.append(Rules._tell_anyone(Rules._is_discardable))
-        # RULE 3b
-        moves.append(Rules._tell_anyone(Rules._is_risky))
-        # RULE 4
-        moves.append(Rules._complete_tell_anyone(Rules._is_playable))
-        # RULE 5
-        moves.append(Rules._complete_tell_anyone(Rules._is_discardable))
-        # RULE 6
-        moves.append(Rules._complete_tell_anyone(Rules._is_unplayable))
-        # RULE 7
-        # # probability p ∈ [0.4, 0.8]
-        # highest = 0.8
-        # lowest = 0.4
-        # # p = highest + len(deck)*(lowest-highest)/50  NB: 50 is the max length of deck
-        # p = highest + len(state.deck)*(lowest-highest/50)
-        moves.append(Rules._play_probably_safe(PLAY_SAFE_PROBABILITY))
-        # RULE 8
-        moves.append(Rules._play_probably_safe_late(PLAY_SAFE_LATE_PROBABILITY))
-        # RULE 9
-        moves.append(Rules._discard_probably_useless(DISCARD_PROBABILITY))
-        # RULE 10
-        # moves.append(Rules._discard_least_likely_to_be_necessary(EXPEND_PROBABILITY))
-        return [m for m in moves if m is not None]
+        for rule in rules:
+            Rules._confidence = 1.0
+            move = rule()
+            if move is not None or keep_empty:
+                moves.append((move, Rules._confidence))
+        return moves
 
     @staticmethod
     def _all_equal(iterator) -> bool:
@@ -174,7 +274,7 @@ class Rules:
             assert number_of_determinizations > 0
             matching_count = 0
             for r, c in zip(*np.nonzero(possibilities)):
-                if fn_condition(Card(r + 1, c), board, trash):
+                if fn_condition(IDENTITIES[r][c], board, trash):
                     matching_count += possibilities[r][c]
             probabilities[idx] = matching_count / number_of_determinizations
 
@@ -346,6 +446,7 @@ class Rules:
         )
 
         if np.max(probabilities) >= threshold:
+            Rules._confidence = float(np.max(probabilities))
             return GameMove(
                 Rules._player, action_type, card_idx=np.argmax(probabilities)
             )
@@ -364,7 +465,7 @@ class Rules:
         """
 
         move = None
-        if len(Rules._state.deck) <= RULE_8_DECK_LENGTH:
+        if len(Rules._state.deck) <= Rules._params.rule_8_deck_length:
             move = Rules._play_probably_safe(threshold)
         return move
 
@@ -395,15 +496,17 @@ class Rules:
             hand, Rules._is_discardable, Rules._state.board, Rules._state.trash
         )
 
-        move = Rules._discard_least_likely_to_be_necessary(EXPEND_PROBABILITY)
+        move = Rules._discard_least_likely_to_be_necessary(
+            Rules._params.expend_probability
+        )
 
         if np.max(probabilities) >= threshold:
             best_idx = np.argmax(probabilities)
         elif move is not None:
-            return move
-        elif Rules._state.used_hints() >= RULE_9_MIN_HINTS:
+            return move  # with the confidence of rule 10
+        elif Rules._state.used_hints() >= Rules._params.rule_9_min_hints:
             # Choose the oldest card whose rank is unknown (or 0 if all the ranks are known)
-            if RULE_9_BEST_IDX_0:
+            if Rules._params.rule_9_best_idx_0:
                 best_idx = 0
             else:
                 best_idx = next(
@@ -413,6 +516,7 @@ class Rules:
             # if only 1 or none used hints, prefer a hint over a discard
             return None
 
+        Rules._confidence = float(np.max(probabilities))
         return GameMove(Rules._player, action_type, card_idx=best_idx)
 
     # RULE 10
@@ -433,6 +537,7 @@ class Rules:
         )
         if np.max(probabilities) >= threshold:
             best_idx = np.argmax(probabilities)
+            Rules._confidence = float(probabilities[best_idx])
             return GameMove(Rules._player, action_type, card_idx=best_idx)
         else:
             return None
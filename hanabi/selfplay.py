@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+import random
+import time
+import numpy as np
+from sys import argv
+from typing import Dict, List, Optional
+import GameData
+from game import Game
+from agent import Agent
+from hyperparameters import Hyperparameters
+from gamelog import GameLogWriter, GameRecorder
+
+
+class GameResult:
+    """
+    Outcome and measurements of a single self-play game.
+
+    Attributes:
+        players:            list of player names in turn order
+        seed:               the seed of the game (None if it was random)
+        score:              the final score of the game
+        turns:              the number of moves performed
+        strikes:            the number of storm tokens used
+        decision_times:     the time (in seconds) spent by the agents on each decision
+        iterations:         the number of MCTS iterations performed for each decision
+        endgame_states:     the number of states evaluated by the endgame solver for each decision
+                            (None for the decisions made by the search)
+        redeterminizations: the number of hands re-determinized during the selection, for each decision
+        reused_determinizations: the number of hands that kept their determinization instead, for each decision
+        redeterminization_times: the time (in seconds) spent re-determinizing and restoring hands, for each decision
+        tree_nodes:         the number of nodes of the search tree of each decision
+        tree_bytes:         the estimated memory used by the search tree of each decision
+        log:                the game encoded as in a game log (see gamelog.py), once it's over
+    """
+
+    def __init__(self, players: List[str], seed: Optional[int] = None) -> None:
+        self.players = players
+        self.seed = seed
+        self.score = 0
+        self.turns = 0
+        self.strikes = 0
+        self.decision_times = []
+        self.iterations = []
+        self.endgame_states = []
+        self.redeterminizations = []
+        self.reused_determinizations = []
+        self.redeterminization_times = []
+        self.tree_nodes = []
+        self.tree_bytes = []
+        self.log = None
+
+    def mean_latency(self) -> float:
+        """
+        Returns the average time (in seconds) spent for a single decision
+        """
+        if len(self.decision_times) == 0:
+            return 0.0
+        return sum(self.decision_times) / len(self.decision_times)
+
+    def iterations_per_second(self) -> float:
+        """
+        Returns the average number of MCTS iterations performed per second of search
+        (the decisions of the endgame solver are left out)
+        """
+        elapsed = sum(
+            decision_time
+            for decision_time, states in zip(self.decision_times, self.endgame_states)
+            if states is None
+        )
+        if elapsed == 0:
+            return 0.0
+        return sum(self.iterations) / elapsed
+
+    def to_dict(self) -> Dict:
+        return {
+            "players": len(self.players),
+            "seed": self.seed,
+            "score": self.score,
+            "turns": self.turns,
+            "strikes": self.strikes,
+            "decision_time": sum(self.decision_times),
+            "mean_latency": self.mean_latency(),
+            "max_latency": max(self.decision_times, default=0.0),
+            "iterations": sum(self.iterations),
+            "iterations_per_second": self.iterations_per_second(),
+            "endgame_states": sum(states for states in self.endgame_states if states is not None),
+            "redeterminizations": sum(self.redeterminizations),
+            "reused_determinizations": sum(self.reused_determinizations),
+            "redeterminization_time": sum(self.redeterminization_times),
+            "max_tree_nodes": max(self.tree_nodes, default=0),
+            "max_tree_bytes": max(self.tree_bytes, default=0),
+        }
+
+    def __repr__(self):
+        return (
+            f"GameResult (players={len(self.players)}, score={self.score}, turns={self.turns}, "
+            f"strikes={self.strikes}, mean_latency={self.mean_latency():.3f}s, "
+            f"iterations/s={self.iterations_per_second():.1f})"
+        )
+
+
+class SelfPlayGame:
+    """
+    Headless game between agents: the server-side Game is driven in-process and every
+    GameData.ServerToClientData it produces is fed straight into the Agent tracking methods,
+    exactly as agent-client.py would do after receiving it from the server.
+
+    Attributes:
+        game:               the server-side game
+        agents:             dictionary with player names as keys and agents as values
+        current_player:     the name of the player whose turn is
+        result:             the measurements collected so far
+    """
+
+    def __init__(
+        self,
+        num_players: int,
+        params: Hyperparameters = None,
+        seed: Optional[int] = None,
+        validate: bool = False,
+        names: Optional[List[str]] = None,
+        deck: Optional[List[int]] = None,
+        log: Optional[GameLogWriter] = None,
+    ) -> None:
+        """
+        Create a new game and deal the cards
+
+        Args:
+            num_players: the number of seats (2-5)
+            params: the hyperparameters shared by all the agents (None for the default ones)
+            seed: the seed used to shuffle the deck and to initialize the agents' random generators
+            validate: whether to assert after every draw that the agents are aligned with the server
+            names: the names of the players in turn order (None for a1, a2, ...)
+            deck: the ids of the cards of the deck, in order, instead of shuffling it
+            log: the game log where the game is recorded (None to keep only the recording in `recorder`)
+        """
+        if num_players < 2 or num_players > 5:
+            raise ValueError(f"Cannot play with {num_players} players")
+        self.validate = validate
+        self.seed = seed
+        if seed is not None:
+            np.random.seed(seed)
+            random.seed(seed)
+        if names is None:
+            names = [f"a{i}" for i in range(1, num_players + 1)]
+
+        self.game = Game()
+        self.recorder = GameRecorder(log)
+        self.game.setRecorder(self.recorder)
+        for name in names:
+            self.game.addPlayer(name)
+            self.game.setPlayerReady(name)
+        self.game.start(seed, deck)
+
+        self.agents = {
+            name: Agent(name, self._show(name), names, params) for name in names
+        }
+        self.current_player = names[0]
+        self.result = GameResult(names, seed)
+        self._over = False
+
+    def _show(self, name: str) -> GameData.ServerGameStateData:
+        """
+        Returns the game state as seen by the player `name`
+        """
+        data, _ = self.game.satisfyRequest(
+            GameData.ClientGetGameStateRequest(name), name
+        )
+        return data
+
+    def is_over(self) -> bool:
+        return self._over
+
+    def step(self) -> bool:
+        """
+        Let the current player make its move and track it for every agent.
+        Returns False if the game is over.
+        """
+        if self._over:
+            return False
+        agent = self.agents[self.current_player]
+        start_time = time.perf_counter()
+        move = agent.make_move()
+        self.result.decision_times.append(time.perf_counter() - start_time)
+        self.result.iterations.append(agent.last_search_iterations)
+        self.result.endgame_states.append(agent.last_endgame_states)
+        self.result.redeterminizations.append(agent.last_redeterminizations)
+        self.result.reused_determinizations.append(agent.last_reused_determinizations)
+        self.result.redeterminization_times.append(agent.last_redeterminization_time)
+        self.result.tree_nodes.append(agent.last_tree_nodes)
+        self.result.tree_bytes.append(agent.last_tree_bytes)
+        return self.apply(move)
+
+    def apply(self, move: GameData.ClientToServerData) -> bool:
+        """
+        Perform the move of the current player and track it for every agent.
+        Returns False if the game is over.
+
+        Args:
+            move: the request of the current player
+        """
+        self.result.turns += 1
+        singleData, multipleData = self.game.satisfyRequest(move, self.current_player)
+        if singleData is not None:
+            raise RuntimeError(
+                f"{self.current_player} performed an invalid move: {vars(singleData)}"
+            )
+        self.result.strikes = self.game.getStormTokens()
+        if type(multipleData) is GameData.ServerGameOver:
+            self.result.score = multipleData.score
+            self.result.log = self.recorder.data
+            self._over = True
+            return False
+
+        for agent in self.agents.values():
+            self._track(agent, multipleData)
+        self.current_player = multipleData.player
+        return True
+
+    def play(self) -> GameResult:
+        """
+        Play the game until it's over and return its result
+        """
+        while self.step():
+            pass
+        return self.result
+
+    def _track(self, agent: Agent, data: GameData.ServerToClientData) -> None:
+        """
+        Update the knowledge of the agent with the outcome of the last move (see agent-client.py)
+
+        Args:
+            agent: the agent to update
+            data: the data that the server would have sent to the agent
+        """
+        if type(data) is GameData.ServerHintData:
+            agent.track_hint(data.destination, data.positions, data.type, data.value)
+            return
+
+        if data.lastPlayer == agent.name:
+            agent.discover_own_card(data.card, data.cardHandIndex)
+        if type(data) is GameData.ServerActionValid:
+            agent.track_discarded_card(data.lastPlayer, data.cardHandIndex)
+        else:
+            agent.track_played_card(
+                data.lastPlayer,
+                data.cardHandIndex,
+                correctly=type(data) is GameData.ServerPlayerMoveOk,
+            )
+
+        if data.handLength == agent.hand_size:
+            if data.lastPlayer == agent.name:
+                agent.draw_card()
+            else:
+                agent.track_card_drawn_by(data.lastPlayer, data.drawnCard)
+                if self.validate:
+                    state = self._show(agent.name)
+                    agent.assert_aligned_with_server(
+                        state.usedNoteTokens,
+                        state.usedStormTokens,
+                        state.tableCards,
+                        state.discardPile,
+                        state.players,
+                    )
+
+
+def play_game(
+    num_players: int,
+    params: Hyperparameters = None,
+    seed: Optional[int] = None,
+    log: Optional[GameLogWriter] = None,
+) -> GameResult:
+    """
+    Play a whole self-play game and return its result
+
+    Args:
+        num_players: the number of seats (2-5)
+        params: the hyperparameters shared by all the agents (None for the default ones)
+        seed: the seed of the game (None for a random one)
+        log: the game log where the game is recorded
+    """
+    return SelfPlayGame(num_players, params, seed, log=log).play()
+
+
+if __name__ == "__main__":
+    if len(argv) < 2:
+        print(f"Usage: {argv[0]} <num_players> [num_games] [game log]")
+        exit(-1)
+    num_players = int(argv[1])
+    num_games = int(argv[2]) if len(argv) > 2 else 1
+    log = GameLogWriter(argv[3]) if len(argv) > 3 else None
+    for _ in range(num_games):
+        print(play_game(num_players, log=log))
+    if log is not None:
+        log.close()
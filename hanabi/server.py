@@ -1,167 +1,362 @@
+import asyncio
+import copy
 import os
 import GameData
-import socket
 from game import Game
+from gamelog import GameLogWriter, GameRecorder
 from game import Player
 import threading
 from constants import *
 from signal import signal, SIGPIPE, SIG_DFL
 import logging
+from logpipeline import setup_logging, stop_logging
 import sys
 
-mutex = threading.Lock()
 # SERVER
-playerConnections = {}
-game = Game()
-
-mutex = threading.Lock()
-
-playersOk = []
+# All the connections are served by a single asyncio event loop: the game state is only touched by
+# the loop, between two awaits, so it doesn't need any lock.
+numPlayers = 2
+# binary log where the games of every room are recorded (None to disable it)
+gameLog = None
 
 statuses = [
     "Lobby",
     "Game"
 ]
-status = statuses[0]
 
-commandQueue = {}
-numPlayers = 2
 
+class Connection(object):
+    '''
+    The outgoing side of a client connection: messages are put on a queue and written by a dedicated task,
+    so sending never waits for the client.
+    A client that doesn't read its messages (too many queued, or a write that takes too long) is disconnected.
+    addr: the address of the client.
+    '''
+    def __init__(self, writer: asyncio.StreamWriter, addr) -> None:
+        super().__init__()
+        self.writer = writer
+        self.addr = addr
+        self.queue = asyncio.Queue()
+        self.closed = False
+        self.task = asyncio.get_running_loop().create_task(self.__writeLoop())
 
-def manageConnection(conn: socket, addr):
-    global status
-    global game
-    with conn:
-        logging.info("Connected by: " + str(addr))
-        keepActive = True
-        playerName = ""
-        while keepActive:
-            print("SERVER WAITING")
-            data = conn.recv(DATASIZE)
+    def send(self, serialized: bytes) -> None:
+        '''
+        Queue an already serialized message (the same bytes can be shared by many connections).
+        '''
+        if self.closed:
+            return
+        if self.queue.qsize() >= MAX_PENDING_MESSAGES:
+            logging.warning("Too many pending messages for %s, disconnecting", self.addr)
+            self.close()
+            return
+        self.queue.put_nowait(serialized)
+
+    def sendData(self, data: GameData.GameData) -> None:
+        self.send(data.serialize())
+
+    def close(self) -> None:
+        '''
+        Stop sending and close the socket: the reading side will see the disconnection.
+        '''
+        if not self.closed:
+            self.closed = True
+            self.task.cancel()
+            self.writer.close()
+
+    def closeWhenSent(self) -> None:
+        '''
+        Close the socket after writing the messages already queued.
+        '''
+        if not self.closed:
+            self.queue.put_nowait(None)
+
+    async def __writeLoop(self) -> None:
+        try:
+            while True:
+                chunks = [await self.queue.get()]
+                # everything queued in the meantime goes in the same write
+                while not self.queue.empty():
+                    chunks.append(self.queue.get_nowait())
+                last = None in chunks
+                if last:
+                    chunks = chunks[:chunks.index(None)]
+                self.writer.write(b"".join(chunks))
+                await asyncio.wait_for(self.writer.drain(), SEND_TIMEOUT)
+                if last:
+                    self.closed = True
+                    self.writer.close()
+                    return
+        except asyncio.TimeoutError:
+            logging.warning("Client %s is not reading, disconnecting", self.addr)
+            self.close()
+        except ConnectionError:
+            self.close()
+
+
+class Room(object):
+    '''
+    A table of the server, with its own game and lobby.
+    name: the name of the room.
+    game: the game played in the room.
+    playerConnections: dictionary with player names as keys and connections as values.
+    playersOk: the players that received the game start message.
+    status: "Lobby" or "Game".
+    commandQueue: the requests received in the lobby, to be satisfied when the game starts.
+    autoAssigned: whether the players are assigned to the room by the server.
+    '''
+    def __init__(self, name: str, autoAssigned: bool = False) -> None:
+        super().__init__()
+        self.name = name
+        self.autoAssigned = autoAssigned
+        self.game = Game()
+        if gameLog is not None:
+            self.game.setRecorder(GameRecorder(gameLog))
+        self.playerConnections = {}
+        self.playersOk = []
+        self.status = statuses[0]
+        self.commandQueue = {}
+
+    def isFull(self) -> bool:
+        return len(self.playerConnections) >= numPlayers
+
+
+class Results(object):
+    '''
+    The results of the games played in all the rooms.
+    '''
+    def __init__(self) -> None:
+        super().__init__()
+        self.games = 0
+        self.totalScore = 0
+        self.scores = {}
+
+    def add(self, score: int) -> None:
+        self.games += 1
+        self.totalScore += score
+        self.scores[score] = self.scores.get(score, 0) + 1
+
+    def __str__(self) -> str:
+        return self.toString()
 
-            mutex.acquire(True)
+    def toString(self) -> str:
+        if self.games == 0:
+            return "No games played"
+        return ("Games played: " + str(self.games) + "; average score: " + str(round(self.totalScore / self.games, 2)) +
+                "; scores: " + str(dict(sorted(self.scores.items()))))
+
+
+rooms = {}
+results = Results()
+roomCounter = 0
+
+
+def getRoom(name: str) -> Room:
+    '''
+    Returns the room with the given name, creating it if needed.
+    If name is None, returns a room in the lobby with a free seat.
+    '''
+    global roomCounter
+    if name is None:
+        for room in rooms.values():
+            if room.autoAssigned and room.status == "Lobby" and not room.isFull():
+                return room
+        roomCounter += 1
+        while "room-" + str(roomCounter) in rooms:
+            roomCounter += 1
+        name = "room-" + str(roomCounter)
+        rooms[name] = Room(name, autoAssigned=True)
+        logging.info("Room created: %s", name)
+    elif name not in rooms:
+        rooms[name] = Room(name)
+        logging.info("Room created: %s", name)
+    return rooms[name]
+
+
+def gameOver(room: Room) -> None:
+    '''
+    Record the result of the game of the room, then start a new game between the same players.
+    '''
+    results.add(room.game.getScore())
+    logging.info("Game over in room %s", room.name)
+    logging.info("Game score: %d", room.game.getScore())
+    logging.info("%s", results)
+    logging.info("Starting new game")
+    room.game.reset()
+
+
+def broadcast(room: Room, data: GameData.GameData) -> None:
+    '''
+    Send a message to all the players of the room: it is serialized only once.
+    A card drawn after a play or a discard is pushed to the other players, but hidden from the one who drew it
+    (so that nobody needs to ask for the whole game state after every draw).
+    '''
+    serialized = data.serialize()
+    drawer = None
+    if getattr(data, "drawnCard", None) is not None:
+        drawer = data.lastPlayer
+        hidden = copy.copy(data)
+        hidden.drawnCard = None
+        hiddenSerialized = hidden.serialize()
+    for name, connection in room.playerConnections.items():
+        connection.send(hiddenSerialized if name == drawer else serialized)
+
+
+def leave(room: Room, playerName: str) -> None:
+    '''
+    Remove a disconnected player from its room, and the room from the server if it's empty.
+    '''
+    if room is None:
+        return
+    room.playerConnections.pop(playerName, None)
+    room.game.removePlayer(playerName)
+    if len(room.playerConnections) == 0:
+        logging.info("Room closed: %s", room.name)
+        del rooms[room.name]
+    if len(rooms) == 0:
+        logging.info("Shutting down server")
+        exitServer()
+
+
+async def manageConnection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    addr = writer.get_extra_info("peername")
+    logging.debug("Connected by: %s", addr)
+    connection = Connection(writer, addr)
+    keepActive = True
+    playerName = ""
+    room = None
+
+    try:
+        while keepActive:
+            try:
+                data = await GameData.receiveData(reader)
+            except ValueError as e:
+                # the malformed message has already been dropped from the stream
+                logging.warning("Invalid message from %s: %s", addr, e)
+                connection.sendData(GameData.ServerInvalidDataReceived(str(e)))
+                continue
 
             if not data:
-                del playerConnections[playerName]
-                logging.warning("Player disconnected: " + playerName)
-                game.removePlayer(playerName)
-                if len(playerConnections) == 0:
-                    logging.info("Shutting down server")
-                    os._exit(0)
+                logging.info("Player disconnected: %s", playerName)
+                leave(room, playerName)
                 keepActive = False
+            elif room is None:
+                # The first request chooses the room
+                if type(data) is GameData.ClientPlayerAddData:
+                    candidate = getRoom(data.room) if data.sender else None
+                    if candidate is None or data.sender in candidate.playerConnections:
+                        logging.warning("Duplicate player: %s", data.sender)
+                        connection.sendData(GameData.ServerActionInvalid(
+                            "Player with that name already registered."))
+                        connection.closeWhenSent()
+                        return
+                    if candidate.status != "Lobby":
+                        connection.sendData(GameData.ServerActionInvalid(
+                            "The game in room " + candidate.name + " has already started."))
+                        connection.closeWhenSent()
+                        return
+                    room = candidate
+                    playerName = data.sender
+                    room.commandQueue[playerName] = []
+                    room.playerConnections[playerName] = connection
+                    logging.info("Player connected: %s in room %s", playerName, room.name)
+                    room.game.addPlayer(playerName)
+                    connection.sendData(GameData.ServerPlayerConnectionOk(
+                        playerName, room.name))
+                else:
+                    connection.sendData(GameData.ServerActionInvalid("You need to join a room first"))
             else:
-                print(
-                    f"SERVER PROCESSING {GameData.GameData.deserialize(data)}")
-                data = GameData.GameData.deserialize(data)
-                print(f"SERVER RECEIVED {type(data)} from {data.sender}")
-                if status == "Lobby":
-                    if type(data) is GameData.ClientPlayerAddData:
-                        playerName = data.sender
-                        commandQueue[playerName] = []
-                        if playerName in playerConnections.keys() or playerName == "" and playerName is None:
-                            logging.warning("Duplicate player: " + playerName)
-                            conn.send(GameData.ServerActionInvalid(
-                                "Player with that name already registered.").serialize())
-                            mutex.release()
-                            return
-                        playerConnections[playerName] = (conn, addr)
-                        logging.info("Player connected: " + playerName)
-                        game.addPlayer(playerName)
-                        conn.send(GameData.ServerPlayerConnectionOk(
-                            playerName).serialize())
-                    elif type(data) is GameData.ClientPlayerStartRequest:
+                game = room.game
+                if room.status == "Lobby":
+                    if type(data) is GameData.ClientPlayerStartRequest:
                         game.setPlayerReady(playerName)
-                        logging.info("Player ready: " + playerName)
-                        conn.send(GameData.ServerPlayerStartRequestAccepted(
-                            len(game.getPlayers()), game.getNumReadyPlayers()).serialize())
+                        logging.debug("Player ready: %s", playerName)
+                        connection.sendData(GameData.ServerPlayerStartRequestAccepted(
+                            len(game.getPlayers()), game.getNumReadyPlayers()))
 
                         if len(game.getPlayers()) == game.getNumReadyPlayers() and len(game.getPlayers()) >= numPlayers:
                             listNames = []
                             for player in game.getPlayers():
                                 listNames.append(player.name)
-                            logging.info(
-                                "Game start! Between: " + str(listNames))
-                            for player in playerConnections:
-                                playerConnections[player][0].send(
-                                    GameData.ServerStartGameData(listNames).serialize())
+                            logging.info("Game start in room %s! Between: %s", room.name, listNames)
+                            broadcast(room, GameData.ServerStartGameData(listNames))
                             game.start()
 
                     # This ensures every player is ready to send requests
                     elif type(data) is GameData.ClientPlayerReadyData:
-                        playersOk.append(1)
+                        room.playersOk.append(1)
                     # If every player is ready to send requests, then the game can start
-                    if len(playersOk) == len(game.getPlayers()):
-                        status = "Game"
-                        for player in commandQueue:
-                            for cmd in commandQueue[player]:
+                    if len(room.playersOk) == len(game.getPlayers()):
+                        room.status = "Game"
+                        for player in room.commandQueue:
+                            for cmd in room.commandQueue[player]:
                                 singleData, multipleData = game.satisfyRequest(
                                     cmd, player)
                                 if singleData is not None:
-                                    playerConnections[player][0].send(
-                                        singleData.serialize())
+                                    room.playerConnections[player].sendData(singleData)
                                 if multipleData is not None:
-                                    for id in playerConnections:
-                                        playerConnections[id][0].send(
-                                            multipleData.serialize())
-                                        if game.isGameOver():
-                                            os._exit(0)
-                        commandQueue.clear()
+                                    broadcast(room, multipleData)
+                                    if game.isGameOver():
+                                        gameOver(room)
+                                        game = room.game
+                        room.commandQueue.clear()
                     elif type(data) is not GameData.ClientPlayerAddData and type(
                             data) is not GameData.ClientPlayerStartRequest and type(
                             data) is not GameData.ClientPlayerReadyData:
-                        commandQueue[playerName].append(data)
+                        room.commandQueue[playerName].append(data)
                 # In game
-                elif status == "Game":
+                elif room.status == "Game":
                     singleData, multipleData = game.satisfyRequest(
                         data, playerName)
                     if singleData is not None:
-                        conn.send(singleData.serialize())
+                        connection.sendData(singleData)
                     if multipleData is not None:
-                        for id in playerConnections:
-                            playerConnections[id][0].send(
-                                multipleData.serialize())
-                            if game.isGameOver():
-                                logging.info("Game over")
-                                logging.info("Game score: " +
-                                             str(game.getScore()))
-                                # os._exit(0)
-                                players = game.getPlayers()
-                                game = Game()
-                                for player in players:
-                                    logging.info("Starting new game")
-                                    game.addPlayer(player.name)
-                                game.start()
-            mutex.release()
+                        broadcast(room, multipleData)
+                        if game.isGameOver():
+                            gameOver(room)
+    except ConnectionError:
+        logging.warning("Connection lost: %s", playerName)
+        leave(room, playerName)
+        keepActive = False
+    finally:
+        if not keepActive:
+            connection.close()
+
+
+def exitServer():
+    if gameLog is not None:
+        gameLog.flush()
+    # os._exit doesn't run the exit handlers: write the pending log records first
+    stop_logging()
+    os._exit(0)
 
 
 def manageInput():
     while True:
         data = input()
         if data == "exit":
+            logging.info("%s", results)
             logging.info("Closing the server...")
-            os._exit(0)
+            exitServer()
 
 
-def manageNetwork(server_port):
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        s.bind((HOST, PORT))
-        logging.info("Hanabi server started on " + HOST + ":" + str(server_port))
-        while True:
-            s.listen()
-            conn, addr = s.accept()
-            threading.Thread(target=manageConnection,
-                             args=(conn, addr)).start()
+async def manageNetwork(server_port):
+    server = await asyncio.start_server(manageConnection, HOST, server_port, reuse_address=True, backlog=1024)
+    logging.info("Hanabi server started on %s:%d with %d players per room", HOST, server_port, numPlayers)
+    async with server:
+        await server.serve_forever()
 
 
-def start_server(nplayers, server_port):
+def start_server(nplayers, server_port, gameLogPath=None):
     global numPlayers
+    global gameLog
     numPlayers = nplayers
-    logging.basicConfig(filename="game.log", level=logging.INFO, format='%(asctime)s %(levelname)s: %(message)s',
-                        datefmt="%m/%d/%Y %I:%M:%S %p")
-    logging.getLogger().addHandler(logging.StreamHandler(sys.stdout))
-    threading.Thread(target=manageNetwork, args=(server_port,)).start()
-    manageInput()
+    if gameLogPath is not None:
+        gameLog = GameLogWriter(gameLogPath)
+    # the records are written by a background thread, in batches (see logpipeline.py)
+    setup_logging(LOG_LEVEL, filename="game.log")
+    threading.Thread(target=manageInput, daemon=True).start()
+    asyncio.run(manageNetwork(server_port))
 
 
 if __name__ == '__main__':
@@ -173,4 +368,6 @@ if __name__ == '__main__':
             numPlayers = int(sys.argv[1])
         if len(sys.argv) >= 2 and int(sys.argv[2]) >= 1024:
             port = int(sys.argv[2])
-    start_server(numPlayers, port)
+    # optional binary game log (see gamelog.py)
+    gameLogPath = sys.argv[3] if len(sys.argv) > 3 else None
+    start_server(numPlayers, port, gameLogPath)
@@ -0,0 +1,44 @@
+from types import MappingProxyType
+from utils import Card, Color, CARD_QUANTITIES, FULL_TABLE
+
+# Constant tables of the game, built once at import and read-only: the functions that need them
+# must not rebuild (or modify) them.
+
+# number of copies of each card: FULL_TABLE[rank - 1][color] (built in utils, which the tables depend on)
+DECK_SIZE = int(FULL_TABLE.sum())
+
+# the card with a given identity, nothing known: IDENTITIES[rank - 1][color]
+IDENTITIES = tuple(
+    tuple(Card(rank, color) for color in Color)
+    for rank in range(1, len(CARD_QUANTITIES) + 1)
+)
+
+# cards in a hand, by number of players
+HAND_SIZES = MappingProxyType({2: 5, 3: 5, 4: 4, 5: 4})
+
+# every hint that can be given to a player, in the order the rules and the model try them
+HINTS = tuple(("value", rank) for rank in range(1, len(CARD_QUANTITIES) + 1)) + tuple(
+    ("color", color) for color in range(len(Color))
+)
+
+
+def _hint_outcomes(hint_type: str, hint_value: int) -> tuple:
+    """
+    Returns the card that each card code becomes when the hint is given (the card itself if it isn't touched)
+    """
+    outcomes = [None] * 256
+    for code in range(256):
+        try:
+            card = Card.from_code(code)
+        except ValueError:
+            continue
+        if hint_type == "value" and card.rank is not None and card.rank == hint_value:
+            card = card.reveal_rank()
+        elif hint_type == "color" and card.color is not None and card.color == hint_value:
+            card = card.reveal_color()
+        outcomes[code] = card
+    return tuple(outcomes)
+
+
+# HINT_OUTCOMES[(hint type, hint value)][card code]: the card after the hint
+HINT_OUTCOMES = MappingProxyType({hint: _hint_outcomes(*hint) for hint in HINTS})
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules of the project are imported by name, as the scripts do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,121 @@
+import pytest
+import codec
+import GameData
+from game import CARDS, COLORS
+
+
+def _player(name, ready, hand):
+    player = GameData.Player(name)
+    player.ready = ready
+    player.hand = list(hand)
+    return player
+
+
+# a value of every field type (the optional ones are tested both with and without a value)
+SAMPLES = {
+    "str": ["alice", ""],
+    "optional str": ["room-1", None],
+    "int": [7, -1],
+    "value": [3, "red", None],
+    "card": [CARDS[0], CARDS[49]],
+    "optional card": [CARDS[12], None],
+    "ints": [[0, 2, 4], []],
+    "strs": [["a1", "a2", "a3"], []],
+    "cards": [list(CARDS[:5]), []],
+    "players": [[_player("a1", True, CARDS[5:10]), _player("a2", False, [])]],
+    "table": [{color: list(CARDS[i:i + 2]) for i, color in enumerate(COLORS)}, {}],
+}
+
+
+def _comparable(value):
+    """
+    Returns a value that compares equal for equal decoded and original fields
+    """
+    if isinstance(value, GameData.Card):
+        return ("card", value.id, value.value, value.color)
+    if isinstance(value, GameData.Player):
+        return ("player", value.name, value.ready, _comparable(value.hand))
+    if isinstance(value, list):
+        return [_comparable(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _comparable(item) for key, item in value.items()}
+    return value
+
+
+def _messages(tag):
+    """
+    Returns messages of the schema with the given tag, covering every sample of its fields
+    """
+    name, schema = codec.SCHEMAS[tag]
+    cls = getattr(GameData, name)
+    variants = max(len(SAMPLES[field]) for _, field in schema)
+    messages = []
+    for variant in range(variants):
+        message = cls.__new__(cls)
+        message.__dict__ = dict(codec._defaults(cls))
+        for attribute, field in schema:
+            samples = SAMPLES[field]
+            setattr(message, attribute, samples[variant % len(samples)])
+        messages.append(message)
+    return messages
+
+
+@pytest.mark.parametrize("tag", sorted(codec.SCHEMAS))
+def test_round_trip(tag):
+    for message in _messages(tag):
+        decoded = codec.decode(codec.encode(message))
+        assert type(decoded) is type(message)
+        assert _comparable(vars(decoded)) == _comparable(vars(message))
+
+
+@pytest.mark.parametrize("tag", sorted(codec.SCHEMAS))
+def test_truncated_payload(tag):
+    for message in _messages(tag):
+        payload = codec.encode(message)
+        for size in range(len(payload)):
+            with pytest.raises(ValueError):
+                codec.decode(payload[:size])
+
+
+def test_trailing_bytes():
+    payload = codec.encode(GameData.ClientPlayerStartRequest("a1"))
+    with pytest.raises(ValueError):
+        codec.decode(payload + b"\x00")
+
+
+def test_wrong_version():
+    payload = bytearray(codec.encode(GameData.ClientPlayerStartRequest("a1")))
+    payload[0] = codec.VERSION + 1
+    with pytest.raises(ValueError, match="version"):
+        codec.decode(bytes(payload))
+
+
+def test_unknown_tag():
+    payload = bytearray(codec.encode(GameData.ClientPlayerStartRequest("a1")))
+    payload[1] = 255
+    with pytest.raises(ValueError, match="tag"):
+        codec.decode(bytes(payload))
+
+
+def test_unknown_message_type():
+    with pytest.raises(ValueError):
+        codec.encode(GameData.ClientToServerData("a1", "unknown"))
+
+
+def test_decoded_cards_are_not_shared():
+    message = GameData.ServerPlayerMoveOk("a2", "a1", CARDS[3], 0, 5, CARDS[4])
+    payload = codec.encode(message)
+    first = codec.decode(payload)
+    first.card.value = 5
+    second = codec.decode(payload)
+    assert second.card is not first.card
+    assert second.card.value == CARDS[3].value
+
+
+def test_serialize_frames_the_payload():
+    message = GameData.ClientHintData("a1", "a2", "color", "blue")
+    serialized = message.serialize()
+    size = int.from_bytes(serialized[:GameData.HEADER_SIZE], "little")
+    assert size == len(serialized) - GameData.HEADER_SIZE
+    decoded = GameData.GameData.deserialize(serialized)
+    assert vars(decoded) == vars(message)
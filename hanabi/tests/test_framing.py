@@ -0,0 +1,79 @@
+import asyncio
+import pytest
+import GameData
+from constants import MAX_DATASIZE
+
+
+class FakeSocket:
+    """
+    Socket returning the given chunks, one per recv, and then the end of the stream
+    """
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+
+    def recv(self, size):
+        if len(self.chunks) == 0:
+            return b""
+        chunk = self.chunks.pop(0)
+        assert len(chunk) <= size
+        return chunk
+
+
+MESSAGES = [
+    GameData.ClientPlayerStartRequest("a1"),
+    GameData.ClientHintData("a1", "a2", "value", 4),
+    GameData.ServerGameOver(17, "Good!"),
+]
+STREAM = b"".join(message.serialize() for message in MESSAGES)
+
+
+def _read_all(reader):
+    messages = []
+    while True:
+        data = reader.read()
+        if data is None:
+            return messages
+        messages.append(vars(data))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, len(STREAM)])
+def test_split_reads(chunk_size):
+    chunks = [STREAM[i:i + chunk_size] for i in range(0, len(STREAM), chunk_size)]
+    reader = GameData.DataReader(FakeSocket(chunks))
+    assert _read_all(reader) == [vars(message) for message in MESSAGES]
+
+
+def test_split_header():
+    first = MESSAGES[0].serialize()
+    chunks = [first[:1], first[1:3], first[3:] + STREAM[len(first):]]
+    reader = GameData.DataReader(FakeSocket(chunks))
+    assert _read_all(reader) == [vars(message) for message in MESSAGES]
+
+
+def test_incomplete_message_at_close():
+    reader = GameData.DataReader(FakeSocket([STREAM[:-1]]))
+    assert _read_all(reader) == [vars(message) for message in MESSAGES[:-1]]
+
+
+def test_message_too_big():
+    header = (MAX_DATASIZE + 1).to_bytes(GameData.HEADER_SIZE, "little")
+    reader = GameData.DataReader(FakeSocket([header]))
+    with pytest.raises(ValueError):
+        reader.read()
+
+
+def test_receive_data():
+    async def receive_all():
+        reader = asyncio.StreamReader()
+        for i in range(0, len(STREAM), 5):
+            reader.feed_data(STREAM[i:i + 5])
+        reader.feed_eof()
+        messages = []
+        while True:
+            data = await GameData.receiveData(reader)
+            if data is None:
+                return messages
+            messages.append(vars(data))
+
+    assert asyncio.run(receive_all()) == [vars(message) for message in MESSAGES]
@@ -0,0 +1,56 @@
+import GameData
+from game import Game
+
+PLAYERS = ["a1", "a2", "a3"]
+
+
+def _new_game(seed):
+    game = Game()
+    for name in PLAYERS:
+        game.addPlayer(name)
+        game.setPlayerReady(name)
+    game.start(seed)
+    return game
+
+
+def _hands(game):
+    return [[card.id for card in player.hand] for player in game.getPlayers()]
+
+
+def _play_some_moves(game, moves=6):
+    for turn in range(moves):
+        name = PLAYERS[turn % len(PLAYERS)]
+        game.satisfyRequest(GameData.ClientPlayerPlayCardRequest(name, 0), name)
+
+
+def test_same_seed_same_deal():
+    assert _hands(_new_game(7)) == _hands(_new_game(7))
+    assert _hands(_new_game(7)) != _hands(_new_game(8))
+
+
+def test_reset_deals_like_a_new_game():
+    game = _new_game(7)
+    _play_some_moves(game)
+    game.reset(11)
+    fresh = _new_game(11)
+    assert _hands(game) == _hands(fresh)
+    assert game.getDeckSize() == fresh.getDeckSize()
+    assert game.getScore() == 0
+    assert game.getStormTokens() == 0
+    assert not game.isGameOver()
+
+
+def test_reset_replays_the_same_game():
+    game = _new_game(3)
+    first = []
+    for turn in range(6):
+        name = PLAYERS[turn % len(PLAYERS)]
+        _, data = game.satisfyRequest(GameData.ClientPlayerPlayCardRequest(name, 0), name)
+        first.append(vars(data))
+    game.reset(3)
+    second = []
+    for turn in range(6):
+        name = PLAYERS[turn % len(PLAYERS)]
+        _, data = game.satisfyRequest(GameData.ClientPlayerPlayCardRequest(name, 0), name)
+        second.append(vars(data))
+    assert first == second
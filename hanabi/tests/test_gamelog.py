@@ -0,0 +1,85 @@
+import pytest
+from gamelog import GameLogReader, GameLogWriter, MAGIC, summary
+from hyperparameters import Hyperparameters
+from selfplay import SelfPlayGame
+
+PARAMS = Hyperparameters(mcts_time_budget=None, mcts_iterations=1, mcts_simulations=1)
+
+
+@pytest.fixture(scope="module")
+def recorded_game():
+    """
+    Plays a seeded game, keeping the state of every agent at the beginning of every turn
+    """
+    game = SelfPlayGame(2, PARAMS, seed=5)
+    states = []
+    while not game.is_over():
+        states.append({name: agent._game_state.to_snapshot() for name, agent in game.agents.items()})
+        game.step()
+    return game.result, states
+
+
+@pytest.fixture
+def log_path(tmp_path, recorded_game):
+    result, _ = recorded_game
+    path = str(tmp_path / "games.log")
+    with GameLogWriter(path) as writer:
+        writer.write(result.log)
+        writer.write(result.log)
+    return path
+
+
+def test_round_trip(log_path, recorded_game):
+    result, _ = recorded_game
+    with GameLogReader(log_path) as reader:
+        assert len(reader) == 2
+        for record in reader:
+            assert record.seed == 5
+            assert record.seats == result.players
+            assert record.score == result.score
+            assert len(record) == result.turns
+    assert summary(log_path) == (2, float(result.score))
+
+
+def test_state_at_matches_the_game(log_path, recorded_game):
+    _, states = recorded_game
+    with GameLogReader(log_path) as reader:
+        record = reader[1]
+        for turn in (0, 1, len(record) // 2, len(record) - 1):
+            for name in record.seats:
+                assert record.state_at(turn, name).to_snapshot() == states[turn][name]
+        with pytest.raises(IndexError):
+            record.state_at(len(record), record.seats[0])
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path / "empty.log"
+    path.write_bytes(b"")
+    with GameLogReader(str(path)) as reader:
+        assert len(reader) == 0
+        assert list(reader) == []
+    assert summary(str(path)) == (0, 0.0)
+
+
+def test_bad_magic(tmp_path):
+    path = tmp_path / "server.log"
+    path.write_bytes(b"10/19/2026 08:24:00 AM INFO: Server started\n" * 4)
+    with pytest.raises(ValueError, match="Not a game log"):
+        GameLogReader(str(path))
+
+
+def test_bad_version(log_path, tmp_path):
+    data = bytearray(open(log_path, "rb").read())
+    data[len(MAGIC)] += 1
+    path = tmp_path / "version.log"
+    path.write_bytes(bytes(data))
+    with pytest.raises(ValueError, match="version"):
+        GameLogReader(str(path))
+
+
+def test_truncated_header(log_path, tmp_path):
+    data = open(log_path, "rb").read()
+    path = tmp_path / "truncated.log"
+    path.write_bytes(data + data[:5])
+    with pytest.raises(ValueError, match="Truncated"):
+        GameLogReader(str(path))
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import math
+import os
+import time
+import traceback
+from collections import Counter
+from multiprocessing import Pool
+from typing import Dict, Iterable, List, Optional, Tuple
+from gamelog import GameLogWriter
+from hyperparameters import Hyperparameters, MCTS_ITERATIONS, MCTS_TIME_BUDGET, REDETERMINIZATION
+from selfplay import play_game
+
+MAX_SCORE = 25
+MAX_STRIKES = 3
+Z_95 = 1.96
+
+
+def mean_confidence_interval(values: List[float], z: float = Z_95) -> Tuple[float, float]:
+    """
+    Returns the mean of the values and the half-width of its (normal approximation) confidence interval
+
+    Args:
+        values: the samples
+        z: the quantile of the standard normal distribution for the chosen confidence level
+    """
+    n = len(values)
+    if n == 0:
+        return 0.0, 0.0
+    mean = sum(values) / n
+    if n == 1:
+        return mean, 0.0
+    variance = sum((v - mean) ** 2 for v in values) / (n - 1)
+    return mean, z * math.sqrt(variance / n)
+
+
+def play_task(task: Tuple) -> Dict:
+    """
+    Worker function: plays a single seeded game and returns its result as a dictionary.
+    Errors are reported in the result instead of stopping the whole tournament.
+
+    Args:
+        task: tuple (num_players, seed, params) or (num_players, seed, params, record): if record is True,
+            the bytes of the game log of the game are returned in result["log"]
+    """
+    num_players, seed, params = task[:3]
+    record = len(task) > 3 and task[3]
+    try:
+        game = play_game(num_players, params, seed)
+        result = game.to_dict()
+        if record:
+            result["log"] = game.log
+        return result
+    except Exception:
+        return {"players": num_players, "seed": seed, "error": traceback.format_exc()}
+
+
+def summarize(results: Iterable[Dict]) -> Dict:
+    """
+    Aggregate the results of many games
+
+    Args:
+        results: the dictionaries returned by GameResult.to_dict
+    """
+    results = list(results)
+    games = [r for r in results if "error" not in r]
+    scores = [r["score"] for r in games]
+    decisions = sum(r["turns"] for r in games)
+    decision_time = sum(r["decision_time"] for r in games)
+
+    score, score_ci = mean_confidence_interval(scores)
+    perfect, perfect_ci = mean_confidence_interval(
+        [float(s == MAX_SCORE) for s in scores]
+    )
+    strike_out, strike_out_ci = mean_confidence_interval(
+        [float(r["strikes"] == MAX_STRIKES) for r in games]
+    )
+    latency, latency_ci = mean_confidence_interval([r["mean_latency"] for r in games])
+    return {
+        "games": len(games),
+        "errors": len(results) - len(games),
+        "score": score,
+        "score_ci": score_ci,
+        "score_distribution": dict(sorted(Counter(scores).items())),
+        "perfect_rate": perfect,
+        "perfect_rate_ci": perfect_ci,
+        "strike_out_rate": strike_out,
+        "strike_out_rate_ci": strike_out_ci,
+        "mean_latency": latency,
+        "mean_latency_ci": latency_ci,
+        "decisions_per_second": decisions / decision_time if decision_time > 0 else 0.0,
+        "redeterminizations": sum(r["redeterminizations"] for r in games),
+        "reused_determinizations": sum(r["reused_determinizations"] for r in games),
+        "redeterminization_time": sum(r["redeterminization_time"] for r in games),
+    }
+
+
+def run_tournament(
+    num_players: int,
+    num_games: int,
+    base_seed: int = 0,
+    params: Hyperparameters = None,
+    workers: Optional[int] = None,
+    output: Optional[str] = None,
+    log: Optional[str] = None,
+) -> Dict:
+    """
+    Play num_games self-play games on a pool of processes (one game per task) and return the aggregated statistics.
+    Game i uses the seed base_seed + i, so the same arguments always produce the same decks.
+
+    Args:
+        num_players: the number of seats of every game
+        num_games: the number of games to play
+        base_seed: the seed of the first game
+        params: the hyperparameters of the agents (None for the default ones)
+        workers: the number of processes (None for one per core)
+        output: path of the file where each game result is appended as a JSON line as soon as it's available
+        log: path of the binary game log where every game is recorded (see gamelog.py)
+    """
+    tasks = [(num_players, base_seed + i, params, log is not None) for i in range(num_games)]
+    results = []
+    out = open(output, "a") if output is not None else None
+    game_log = GameLogWriter(log) if log is not None else None
+    try:
+        with Pool(workers) as pool:
+            for result in pool.imap_unordered(play_task, tasks, chunksize=1):
+                # the games are written by this process only, so the log is never interleaved
+                game = result.pop("log", None)
+                if game_log is not None and game is not None:
+                    game_log.write(game)
+                results.append(result)
+                if out is not None:
+                    out.write(json.dumps(result) + "\n")
+                    out.flush()
+    finally:
+        if out is not None:
+            out.close()
+        if game_log is not None:
+            game_log.close()
+    return summarize(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play many seeded self-play games in parallel")
+    parser.add_argument("players", type=int, help="number of players of each game (2-5)")
+    parser.add_argument("-g", "--games", type=int, default=1000, help="number of games")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("-t", "--time-budget", type=float, default=MCTS_TIME_BUDGET, help="seconds per decision (0 to disable)")
+    parser.add_argument("-i", "--iterations", type=int, default=MCTS_ITERATIONS, help="iterations per decision")
+    parser.add_argument(
+        "-r", "--redeterminization", default=REDETERMINIZATION, choices=["always", "changed", "every_k"],
+        help="when the hands are re-determinized during the selection",
+    )
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(), help="number of processes")
+    parser.add_argument("-o", "--output", default="tournament.jsonl", help="file where game results are streamed")
+    parser.add_argument("-l", "--log", default=None, help="binary game log where the games are recorded")
+    args = parser.parse_args()
+    if args.time_budget is not None and args.time_budget <= 0:
+        args.time_budget = None
+
+    start_time = time.time()
+    params = Hyperparameters(
+        mcts_time_budget=args.time_budget,
+        mcts_iterations=args.iterations,
+        redeterminization=args.redeterminization,
+    )
+    stats = run_tournament(
+        args.players,
+        args.games,
+        args.seed,
+        params,
+        args.workers,
+        args.output,
+        args.log,
+    )
+    print(f"Games played: {stats['games']} ({stats['errors']} errors) in {time.time() - start_time:.1f}s")
+    print(f"Score: {stats['score']:.2f} ± {stats['score_ci']:.2f}")
+    print(f"Perfect games: {100 * stats['perfect_rate']:.1f}% ± {100 * stats['perfect_rate_ci']:.1f}%")
+    print(f"Strike outs: {100 * stats['strike_out_rate']:.1f}% ± {100 * stats['strike_out_rate_ci']:.1f}%")
+    print(f"Decision latency: {stats['mean_latency']:.3f}s ± {stats['mean_latency_ci']:.3f}s")
+    print(f"Decisions per second: {stats['decisions_per_second']:.2f}")
+    print(
+        f"Hands re-determinized: {stats['redeterminizations']}, reused: {stats['reused_determinizations']} "
+        f"({stats['redeterminization_time']:.1f}s)"
+    )
+    print(f"Score distribution: {stats['score_distribution']}")
+
+
+if __name__ == "__main__":
+    main()
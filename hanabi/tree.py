@@ -1,13 +1,21 @@
 import copy
+import sys
 from typing import List
 from model import GameMove
 
 
 class GameNode:
-    def __init__(self, move: GameMove) -> None:
+    def __init__(self, move: GameMove, prior: float = 1.0) -> None:
         self.move = move
         self.value = 0
         self.simulations = 0
+        # the probability of the move according to the rules, when the node was expanded
+        self.prior = prior
+        # the results of the rollouts where the player of the move made it later (all moves as first, RAVE)
+        self.amaf_value = 0
+        self.amaf_simulations = 0
+        # the rollouts made from this node when it was the expanded one
+        self.rollouts = 0
 
     def __copy__(self):
         cls = self.__class__
@@ -16,6 +24,10 @@ class GameNode:
         result.move = copy.copy(self.move)
         result.value = self.value
         result.simulations = self.simulations
+        result.prior = self.prior
+        result.amaf_value = self.amaf_value
+        result.amaf_simulations = self.amaf_simulations
+        result.rollouts = self.rollouts
         return result
 
 
@@ -37,15 +49,123 @@ class Node:
 
 
 class Tree:
-    def __init__(self, root: Node):
+    """
+    Tree stored as a list of nodes, indexed by their ids.
+
+    Attributes:
+        nodes:      the list of nodes (None in the slots of reclaimed nodes)
+        max_nodes:  the maximum number of nodes (None if unbounded)
+        prune:      whether to reclaim the least visited subtrees when the tree is full, instead of refusing new nodes
+        size:       the number of nodes currently in the tree
+        reclaimed:  the total number of nodes reclaimed so far
+    """
+
+    # fraction of max_nodes freed by each reclaim
+    RECLAIM_FRACTION = 0.1
+
+    def __init__(self, root: Node, max_nodes: int = None, prune: bool = False):
+        if max_nodes is not None and max_nodes < 2:
+            raise ValueError("The tree must be able to hold at least the root and one child")
         root.id = 0
         self.nodes = [root]
+        self.max_nodes = max_nodes
+        self.prune = prune
+        self.size = 1
+        self.reclaimed = 0
+        self._free_ids = []
+
+    def __len__(self):
+        return self.size
+
+    def is_full(self) -> bool:
+        return self.max_nodes is not None and self.size >= self.max_nodes
+
+    def make_room(self, parent: Node) -> bool:
+        """
+        Returns True if a new child can be inserted under parent. If the tree is full and pruning is enabled,
+        the least visited subtrees (not containing parent and not directly under the root) are reclaimed first.
+
+        Args:
+            parent: the node that will receive the new child
+        """
+        if not self.is_full():
+            return True
+        if not self.prune:
+            return False
+        return self._reclaim(parent) > 0
 
     def insert(self, node: Node, parent: Node):
-        node.id = len(self.nodes)
+        if not self.make_room(parent):
+            raise RuntimeError("The tree is full")
+        if len(self._free_ids) > 0:
+            node.id = self._free_ids.pop()
+            self.nodes[node.id] = node
+        else:
+            node.id = len(self.nodes)
+            self.nodes.append(node)
         node.parent_id = parent.id
-        self.nodes.append(node)
         self.nodes[node.parent_id].children_ids.append(node.id)
+        self.size += 1
+
+    def _reclaim(self, protected: Node) -> int:
+        """
+        Remove the least visited subtrees, recycling the slots of their nodes. Returns the number of removed nodes.
+
+        Args:
+            protected: the node whose ancestors (and itself) must not be removed
+        """
+        ancestors = {protected.id}
+        node = protected
+        while not node.is_root():
+            node = self.get_parent(node)
+            ancestors.add(node.id)
+
+        candidates = [
+            n
+            for n in self.nodes
+            if n is not None
+            and n.id not in ancestors
+            and not n.is_root()
+            and n.parent_id != 0
+        ]
+        candidates.sort(key=lambda n: n.data.simulations)
+
+        target = max(1, int(self.max_nodes * self.RECLAIM_FRACTION))
+        freed = 0
+        for candidate in candidates:
+            if freed >= target:
+                break
+            if self.nodes[candidate.id] is not candidate:
+                continue  # already removed with an ancestor
+            self.nodes[candidate.parent_id].children_ids.remove(candidate.id)
+            stack = [candidate]
+            while len(stack) > 0:
+                node = stack.pop()
+                stack.extend(self.nodes[i] for i in node.children_ids)
+                self.nodes[node.id] = None
+                self._free_ids.append(node.id)
+                freed += 1
+        self.size -= freed
+        self.reclaimed += freed
+        return freed
+
+    def nbytes(self) -> int:
+        """
+        Returns an estimate of the memory (in bytes) used by the nodes of the tree
+        """
+        total = sys.getsizeof(self.nodes) + sys.getsizeof(self._free_ids)
+        for node in self.nodes:
+            if node is not None:
+                total += (
+                    sys.getsizeof(node)
+                    + sys.getsizeof(node.__dict__)
+                    + sys.getsizeof(node.children_ids)
+                    + sys.getsizeof(node.data)
+                    + sys.getsizeof(node.data.__dict__)
+                    + sys.getsizeof(node.data.move)
+                    + sys.getsizeof(node.data.move.__dict__)
+                )
+        return total
 
     def get_root(self):
         return self.nodes[0]
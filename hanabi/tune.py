@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import math
+import os
+import random
+from multiprocessing import Pool
+from typing import Dict, List, Tuple
+from hyperparameters import Hyperparameters
+from tournament import mean_confidence_interval, play_task
+
+# candidate values of every tuned hyperparameter
+SEARCH_SPACE = {
+    "play_safe_probability": [0.5, 0.6, 0.7, 0.8, 0.9],
+    "discard_probability": [0.5, 0.6, 0.7, 0.8, 0.9],
+    "expend_probability": [0.5, 0.6, 0.7, 0.8, 0.9],
+    "rule_8_deck_length": [0, 3, 5, 8, 10],
+    "rule_9_min_hints": [1, 2, 3, 4],
+    "mcts_simulations": [1, 3, 5, 10, 20],
+    "ucb_c": [0.05, 0.1, 0.25, 0.5, 1.0],
+    "puct_c": [None, 0.5, 1.0, 2.0, 4.0],
+    "rule_prior_decay": [0.6, 0.8, 0.9],
+    "unpruning_width": [1, 2, 3],
+    "dedup_moves": [False, True],
+    "rave_k": [None, 10, 50, 200],
+    "sequential_halving": [False, True],
+    "redeterminization": ["always", "changed"],
+    "endgame_deck_size": [None, 1, 2],
+    "rollout_batch": [None, 2, 3, 5],
+    "rollout_ci_width": [1.0, 2.0, 3.0],
+}
+
+
+def sample_configurations(
+    base: Hyperparameters, n: int, rng: random.Random
+) -> List[Hyperparameters]:
+    """
+    Returns n distinct configurations sampled from SEARCH_SPACE. The first one is always `base`.
+
+    Args:
+        base: the configuration providing the values of the hyperparameters that are not tuned
+        n: the number of configurations
+        rng: the random generator used for sampling
+    """
+    configs = [base]
+    max_configs = math.prod(len(values) for values in SEARCH_SPACE.values())
+    while len(configs) < min(n, max_configs):
+        config = base.replace(
+            **{name: rng.choice(values) for name, values in SEARCH_SPACE.items()}
+        )
+        if config not in configs:
+            configs.append(config)
+    return configs
+
+
+def successive_halving(
+    pool: Pool,
+    num_players: int,
+    configs: List[Hyperparameters],
+    min_games: int,
+    base_seed: int,
+) -> List[Tuple[Hyperparameters, List[int]]]:
+    """
+    Successive halving: every surviving configuration plays the same new seeded games, then the worst half
+    is dropped and the number of games of the next round is doubled, until one configuration is left.
+    Returns the configurations with all their scores, from the last survivor to the first one dropped.
+
+    Args:
+        pool: the pool of processes playing the games
+        num_players: the number of seats of every game
+        configs: the configurations to compare
+        min_games: the number of games of the first round
+        base_seed: the seed of the first game
+    """
+    scores = [[] for _ in configs]
+    alive = list(range(len(configs)))
+    ranking = []
+    games = min_games
+    seed = base_seed
+    while True:
+        tasks = [
+            (num_players, seed + g, configs[c]) for c in alive for g in range(games)
+        ]
+        results = pool.map(play_task, tasks, chunksize=1)
+        for i, result in enumerate(results):
+            # a game that crashed counts as the worst possible one
+            scores[alive[i // games]].append(result.get("score", 0))
+        seed += games
+
+        alive.sort(key=lambda c: sum(scores[c]) / len(scores[c]), reverse=True)
+        if len(alive) == 1:
+            break
+        keep = math.ceil(len(alive) / 2)
+        ranking = alive[keep:] + ranking
+        alive = alive[:keep]
+        games *= 2
+    ranking = alive + ranking
+    return [(configs[c], scores[c]) for c in ranking]
+
+
+def tune(
+    players: List[int],
+    time_budgets: List[float],
+    n_configs: int = 16,
+    min_games: int = 4,
+    base_seed: int = 0,
+    workers: int = None,
+) -> List[Dict]:
+    """
+    Run a successive-halving search for every number of players and every time budget
+
+    Args:
+        players: the numbers of players to tune for
+        time_budgets: the time budgets (in seconds per decision) to tune for
+        n_configs: the number of sampled configurations of each search
+        min_games: the number of games played by each configuration in the first round
+        base_seed: the seed of the first game (and of the configurations sampling)
+        workers: the number of processes (None for one per core)
+    """
+    reports = []
+    with Pool(workers) as pool:
+        for time_budget in time_budgets:
+            base = Hyperparameters(mcts_time_budget=time_budget, mcts_iterations=None)
+            configs = sample_configurations(base, n_configs, random.Random(base_seed))
+            for num_players in players:
+                ranking = successive_halving(
+                    pool, num_players, configs, min_games, base_seed
+                )
+                best, scores = ranking[0]
+                score, score_ci = mean_confidence_interval(scores)
+                reports.append(
+                    {
+                        "players": num_players,
+                        "time_budget": time_budget,
+                        "score": score,
+                        "score_ci": score_ci,
+                        "games": len(scores),
+                        "best": {name: getattr(best, name) for name in SEARCH_SPACE},
+                    }
+                )
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the hyperparameters with successive halving on self-play games")
+    parser.add_argument("-p", "--players", type=int, nargs="+", default=[2, 3, 4, 5], help="numbers of players")
+    parser.add_argument("-t", "--time-budgets", type=float, nargs="+", default=[0.5, 2], help="seconds per decision")
+    parser.add_argument("-c", "--configs", type=int, default=16, help="number of sampled configurations")
+    parser.add_argument("-g", "--min-games", type=int, default=4, help="games per configuration in the first round")
+    parser.add_argument("-s", "--seed", type=int, default=0, help="seed of the first game")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count(), help="number of processes")
+    parser.add_argument("-o", "--output", default="tune.json", help="file where the best settings are written")
+    args = parser.parse_args()
+
+    reports = tune(
+        args.players,
+        args.time_budgets,
+        args.configs,
+        args.min_games,
+        args.seed,
+        args.workers,
+    )
+    for report in reports:
+        print(
+            f"{report['players']} players, {report['time_budget']}s: "
+            f"score {report['score']:.2f} ± {report['score_ci']:.2f} over {report['games']} games"
+        )
+        for name, value in report["best"].items():
+            print(f"\t{name} = {value}")
+    with open(args.output, "w") as out:
+        json.dump(reports, out, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,3 @@
-import copy
 import numpy as np
 from enum import IntEnum
 import random
@@ -31,25 +30,89 @@ color_enum2str = {
 
 CARD_QUANTITIES = [3, 2, 2, 2, 1]
 
+# number of copies of each card: FULL_TABLE[rank - 1][color] (read-only, re-exported by tables)
+FULL_TABLE = np.tile(np.array(CARD_QUANTITIES).reshape(len(CARD_QUANTITIES), 1), len(Color))
+FULL_TABLE.setflags(write=False)
+
 
 class Card:
-    def __init__(
-        self,
+    """
+    Immutable (flyweight) card. Rank (None or 1-5), color (None or a Color), rank_known and color_known are packed
+    in a single small integer, and there is a single interned Card for each of the possible codes: creating,
+    copying or drawing a card never allocates, and copying a hand is just copying a list of references.
+
+    Code layout: bits 0-2 rank (0 = None), bits 3-5 color + 1 (0 = None), bit 6 rank_known, bit 7 color_known.
+    """
+
+    __slots__ = ("code", "rank", "color", "rank_known", "color_known")
+
+    _instances = [None] * 256
+
+    def __new__(
+        cls,
         rank: int,
         color: Color,
         rank_known: bool = False,
         color_known: bool = False,
-    ) -> None:
-        self.rank = rank
-        self.color = color
-        self.rank_known = rank_known
-        self.color_known = color_known
+    ) -> "Card":
+        return cls._instances[Card.encode(rank, color, rank_known, color_known)]
+
+    @staticmethod
+    def encode(
+        rank: int, color: Color, rank_known: bool = False, color_known: bool = False
+    ) -> int:
+        """
+        Returns the code of the card with the given attributes
+        (raises ValueError if the rank isn't None or 1-5, or the color isn't None or a Color)
+        """
+        if rank is not None and not 1 <= rank <= len(CARD_QUANTITIES):
+            raise ValueError(f"Invalid card rank: {rank}")
+        if color is not None and not 0 <= color < len(Color):
+            raise ValueError(f"Invalid card color: {color}")
+        code = 0 if rank is None else int(rank)
+        if color is not None:
+            code |= (int(color) + 1) << 3
+        if rank_known:
+            code |= 0x40
+        if color_known:
+            code |= 0x80
+        return code
+
+    @classmethod
+    def from_code(cls, code: int) -> "Card":
+        "Returns the interned card with the given code"
+        card = cls._instances[code]
+        if card is None:
+            raise ValueError(f"Invalid card code: {code}")
+        return card
+
+    @classmethod
+    def _intern(cls, rank, color, rank_known, color_known) -> None:
+        card = object.__new__(cls)
+        object.__setattr__(card, "code", Card.encode(rank, color, rank_known, color_known))
+        object.__setattr__(card, "rank", rank)
+        object.__setattr__(card, "color", color)
+        object.__setattr__(card, "rank_known", rank_known)
+        object.__setattr__(card, "color_known", color_known)
+        cls._instances[card.code] = card
 
     @classmethod
     def from_server(cls, server_card):
         "Initialize Client crad from server card"
         return cls(server_card.value, color_str2enum[server_card.color])
 
+    def __setattr__(self, name, value):
+        raise AttributeError("Cards are immutable")
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo={}):
+        return self
+
+    def __reduce__(self):
+        return Card.from_code, (self.code,)
+
     def __eq__(self, other):
         if type(other) is not Card:
             raise TypeError(f"Cannot compare type card with {type(other)}")
@@ -58,32 +121,43 @@ class Card:
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    def __hash__(self):
+        return hash((self.rank, self.color))
+
     def __repr__(self):
         rank = str(self.rank) if self.rank is not None else ""
         color = color_enum2str[self.color] if self.color is not None else ""
         return f"Card ({rank},{color})"
 
-    def reveal_rank(self, rank=None) -> None:
+    def reveal_rank(self, rank=None) -> "Card":
+        """
+        Returns the card with the rank known (cards are immutable, so the result must replace this card)
+        """
         if rank is not None:
             if self.rank is not None and self.rank != rank:
                 raise RuntimeError(
                     "Cannot reveal card's rank: a different rank is already set"
                 )
-            self.rank = rank
         elif self.rank is None:
             raise RuntimeError("Cannot reveal card's rank: it's None")
-        self.rank_known = True
+        else:
+            rank = self.rank
+        return Card(rank, self.color, True, self.color_known)
 
-    def reveal_color(self, color=None) -> None:
+    def reveal_color(self, color=None) -> "Card":
+        """
+        Returns the card with the color known (cards are immutable, so the result must replace this card)
+        """
         if color is not None:
             if self.color is not None and self.color != color:
                 raise RuntimeError(
                     "Cannot reveal card's color: a different color is already set"
                 )
-            self.color = color
         elif self.color is None:
             raise RuntimeError("Cannot reveal card's color: it's None")
-        self.color_known = True
+        else:
+            color = self.color
+        return Card(self.rank, color, self.rank_known, True)
 
     def is_fully_determined(self) -> bool:
         return self.rank_known and self.color_known
@@ -92,11 +166,17 @@ class Card:
         return self.rank_known != self.color_known
 
 
+for _rank in [None] + list(range(1, len(CARD_QUANTITIES) + 1)):
+    for _color in [None] + list(Color):
+        for _rank_known in [False, True]:
+            for _color_known in [False, True]:
+                Card._intern(_rank, _color, _rank_known, _color_known)
+del _rank, _color, _rank_known, _color_known
+
+
 class Deck:
     def __init__(self) -> None:
-        col = np.array(CARD_QUANTITIES)
-        col = col.reshape(col.size, 1)
-        self._table = np.tile(col, len(Color))
+        self._table = FULL_TABLE.copy()
         self._reserved_ranks = np.zeros(len(CARD_QUANTITIES), dtype=np.int8)
         self._reserved_colors = np.zeros(len(Color), dtype=np.int8)
 
@@ -108,6 +188,18 @@ class Deck:
         result._reserved_colors = np.copy(self._reserved_colors)
         return result
 
+    @classmethod
+    def from_table(cls, table) -> "Deck":
+        """
+        Returns a deck with the given cards (table[rank - 1][color] copies of each card) and no reservations
+        """
+        deck = cls()
+        deck._table[:, :] = table
+        return deck
+
+    def get_table(self) -> np.ndarray:
+        return self._table
+
     def __len__(self):
         """
         Return the number of cards still available in the deck
@@ -280,14 +372,12 @@ class Trash:
     def __init__(self) -> None:
         self.list = []
         self.maxima = np.full(len(Color), 5, dtype=np.uint8)
-        col = np.array(CARD_QUANTITIES)
-        col = col.reshape(col.size, 1)
-        self._table = np.tile(col, len(Color))
+        self._table = FULL_TABLE.copy()
 
     def __deepcopy__(self, memo={}):
         cls = self.__class__
         result = cls.__new__(cls)
-        result.list = copy.deepcopy(self.list)
+        result.list = list(self.list)  # cards are immutable
         result.maxima = np.copy(self.maxima)
         result._table = np.copy(self._table)
         return result
@@ -320,3 +410,4 @@ class Trash:
 
     def get_table(self) -> np.ndarray:
         return self._table
+